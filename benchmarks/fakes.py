@@ -0,0 +1,348 @@
+"""In-memory stand-ins for MongoDB and the Telegram client, for the benchmark tools.
+
+``FakeCollection`` implements the subset of the Motor collection API the
+``Database`` class uses, with enough of the MongoDB query and update
+language for the bot's own queries. ``CountingCollection`` wraps a fake or a
+real Motor collection and records every round trip in an ``OperationLog``;
+``FakeClient`` records Telegram API calls the same way instead of sending
+them.
+"""
+import asyncio
+import contextvars
+import itertools
+from collections import Counter
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+READ_OPERATIONS = {"find", "find_one", "count_documents", "estimated_document_count", "index_information"}
+WRITE_OPERATIONS = {"insert_one", "update_one", "delete_one", "find_one_and_update", "bulk_write", "create_indexes"}
+
+_MISSING = object()
+
+def _get_path(document: Dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _set_path(document: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+def _matches_condition(value: Any, condition: Any) -> bool:
+    if condition is None:  # Null matches missing fields too
+        return value is _MISSING or value is None
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        return value is not _MISSING and value == condition
+    for operator, operand in condition.items():
+        if operator == "$exists":
+            if (value is not _MISSING) != bool(operand):
+                return False
+        elif operator == "$in":
+            if value is _MISSING or value not in operand:
+                return False
+        elif operator in ("$gt", "$gte", "$lt", "$lte"):
+            if value is _MISSING:
+                return False
+            try:
+                ok = {"$gt": value > operand, "$gte": value >= operand,
+                      "$lt": value < operand, "$lte": value <= operand}[operator]
+            except TypeError:  # MongoDB only compares values of the same type
+                return False
+            if not ok:
+                return False
+        elif operator == "$ne":
+            if value == operand:
+                return False
+        else:
+            raise NotImplementedError(f"Query operator {operator} is not supported by FakeCollection")
+    return True
+
+def matches(document: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """Tell whether a document matches a MongoDB query (the subset the bot uses)."""
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif not _matches_condition(_get_path(document, key), condition):
+            return False
+    return True
+
+def apply_update(document: Dict[str, Any], update: Dict[str, Any], inserting: bool) -> None:
+    """Apply ``$set``, ``$inc``, ``$max`` and (when inserting) ``$setOnInsert`` to a document in place."""
+    for operator, fields in update.items():
+        if operator == "$set" or (operator == "$setOnInsert" and inserting):
+            for path, value in fields.items():
+                _set_path(document, path, value)
+        elif operator == "$inc":
+            for path, amount in fields.items():
+                current = _get_path(document, path)
+                _set_path(document, path, (0 if current is _MISSING else current) + amount)
+        elif operator == "$max":
+            for path, value in fields.items():
+                current = _get_path(document, path)
+                if current is _MISSING or current is None or value > current:
+                    _set_path(document, path, value)
+        elif operator != "$setOnInsert":
+            raise NotImplementedError(f"Update operator {operator} is not supported by FakeCollection")
+
+class FakeCursor:
+    """Cursor over a snapshot of matching documents."""
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self._documents = documents
+        self._limit = 0
+
+    def sort(self, key: str, direction: int = 1) -> "FakeCursor":
+        present = [document for document in self._documents if _get_path(document, key) is not _MISSING]
+        absent = [document for document in self._documents if _get_path(document, key) is _MISSING]
+        present.sort(key=lambda document: _get_path(document, key), reverse=direction < 0)
+        self._documents = absent + present if direction > 0 else present + absent  # Missing sorts lowest
+        return self
+
+    def limit(self, count: int) -> "FakeCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> "FakeCursor":
+        return self
+
+    def _results(self) -> List[Dict[str, Any]]:
+        documents = self._documents[:self._limit] if self._limit else self._documents
+        return [dict(document) for document in documents]
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = self._results()
+        return results if length is None else results[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._results():
+            yield document
+
+class FakeCollection:
+    """In-memory collection implementing the Motor calls made by ``Database``."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name: str):
+        self.name = name
+        self.documents: Dict[int, Dict[str, Any]] = {}  # _id -> document, in insertion order
+        self.indexes: Dict[str, Dict[str, Any]] = {"_id_": {"key": [("_id", 1)]}}
+
+    def _find(self, query: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        return (document for document in self.documents.values() if matches(document, query))
+
+    def _insert(self, document: Dict[str, Any]) -> Any:
+        document.setdefault("_id", next(self._ids))
+        self.documents[document["_id"]] = document
+        return document["_id"]
+
+    def _upsert_document(self, query: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+        document = {key: value for key, value in query.items()
+                    if not key.startswith("$") and not (isinstance(value, dict) and any(k.startswith("$") for k in value))}
+        apply_update(document, update, inserting=True)
+        self._insert(document)
+        return document
+
+    async def find_one(self, query: Optional[Dict[str, Any]] = None, *args, **kwargs) -> Optional[Dict[str, Any]]:
+        document = next(self._find(query), None)
+        return dict(document) if document is not None else None
+
+    def find(self, query: Optional[Dict[str, Any]] = None, *args, **kwargs) -> FakeCursor:
+        return FakeCursor(list(self._find(query)))
+
+    async def count_documents(self, query: Dict[str, Any], **kwargs) -> int:
+        return sum(1 for _ in self._find(query))
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return len(self.documents)
+
+    async def insert_one(self, document: Dict[str, Any], **kwargs) -> SimpleNamespace:
+        return SimpleNamespace(inserted_id=self._insert(dict(document)), acknowledged=True)
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+                         **kwargs) -> SimpleNamespace:
+        document = next(self._find(query), None)
+        if document is not None:
+            apply_update(document, update, inserting=False)
+            return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None, acknowledged=True)
+        if upsert:
+            inserted = self._upsert_document(query, update)
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=inserted["_id"], acknowledged=True)
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None, acknowledged=True)
+
+    async def find_one_and_update(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+                                  return_document: Any = False, **kwargs) -> Optional[Dict[str, Any]]:
+        document = next(self._find(query), None)
+        if document is None:
+            if not upsert:
+                return None
+            document = self._upsert_document(query, update)
+            return dict(document) if return_document else None
+        before = dict(document)
+        apply_update(document, update, inserting=False)
+        return dict(document) if return_document else before  # ReturnDocument.AFTER is True
+
+    async def delete_one(self, query: Dict[str, Any], **kwargs) -> SimpleNamespace:
+        document = next(self._find(query), None)
+        if document is not None:
+            del self.documents[document["_id"]]
+        return SimpleNamespace(deleted_count=int(document is not None), acknowledged=True)
+
+    async def bulk_write(self, operations: List[Any], ordered: bool = True, **kwargs) -> SimpleNamespace:
+        for operation in operations:  # pymongo.UpdateOne keeps its arguments in private attributes
+            await self.update_one(operation._filter, operation._doc, upsert=bool(operation._upsert))
+        return SimpleNamespace(matched_count=len(operations), acknowledged=True)
+
+    async def index_information(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(info) for name, info in self.indexes.items()}
+
+    async def create_indexes(self, indexes: List[Any], **kwargs) -> List[str]:
+        names = []
+        for index in indexes:
+            spec = dict(index.document)
+            name = spec.pop("name")
+            spec["key"] = list(spec["key"].items())
+            self.indexes[name] = spec
+            names.append(name)
+        return names
+
+class OperationLog:
+    """Counts database and Telegram round trips, overall and per scope.
+
+    A scope (see ``scope``) collects the operations made by the task that
+    opened it and the tasks it spawns, which is how operations are
+    attributed to the update being handled.
+    """
+
+    def __init__(self):
+        self.totals: Counter = Counter()  # (kind, name) -> count; kind is "read", "write" or "api"
+        self._scope: contextvars.ContextVar = contextvars.ContextVar("operation_scope", default=None)
+
+    def record(self, kind: str, name: str) -> None:
+        self.totals[(kind, name)] += 1
+        scope = self._scope.get()
+        if scope is not None:
+            scope[(kind, name)] += 1
+
+    @contextmanager
+    def scope(self) -> Iterator[Counter]:
+        operations: Counter = Counter()
+        token = self._scope.set(operations)
+        try:
+            yield operations
+        finally:
+            self._scope.reset(token)
+
+    def reset(self) -> None:
+        self.totals.clear()
+
+    @staticmethod
+    def count(operations: Counter, kind: str) -> int:
+        return sum(count for (operation_kind, _), count in operations.items() if operation_kind == kind)
+
+class CountingCollection:
+    """Wraps a (fake or Motor) collection and records each round trip in an ``OperationLog``."""
+
+    def __init__(self, collection: Any, log: OperationLog):
+        self._collection = collection
+        self._log = log
+        self.name = getattr(collection, "name", "collection")
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._collection, name)
+        if name not in READ_OPERATIONS and name not in WRITE_OPERATIONS:
+            return attribute
+        kind = "read" if name in READ_OPERATIONS else "write"
+        label = f"{self.name}.{name}"
+
+        if name == "find":  # Returns a cursor synchronously; counted as one round trip
+            def find(*args, **kwargs):
+                self._log.record(kind, label)
+                return attribute(*args, **kwargs)
+            return find
+
+        async def operation(*args, **kwargs):
+            self._log.record(kind, label)
+            return await attribute(*args, **kwargs)
+        return operation
+
+COLLECTIONS = ("users", "chats", "games", "broadcasts")
+
+def install_collections(database, log: OperationLog, backend: Optional[Any] = None) -> Dict[str, Any]:
+    """Point a ``Database`` (and its score buffer) at counted collections.
+
+    ``backend`` is a Motor database to count real round trips against; the
+    default is a fresh set of ``FakeCollection`` objects.
+    """
+    collections = {}
+    for name in COLLECTIONS:
+        collection = backend[name] if backend is not None else FakeCollection(name)
+        collections[name] = CountingCollection(collection, log)
+    database.users_collection = collections["users"]
+    database.chats_collection = collections["chats"]
+    database.games_collection = collections["games"]
+    database.broadcasts_collection = collections["broadcasts"]
+    database.score_buffer.collection = collections["users"]
+    database.score_buffer.activity_collections = {"user": collections["users"], "chat": collections["chats"]}
+    return collections
+
+class FakeClient:
+    """Stands in for the Pyrogram client: API calls are recorded and answered with stubs.
+
+    Bound methods of Pyrogram objects (``message.reply_text``,
+    ``callback_query.answer`` ...) call into their client, so updates built
+    with this client never reach Telegram.
+    """
+
+    def __init__(self, log: OperationLog, bot_id: int = 1, username: str = "benchmark_bot"):
+        from pyrogram.types import User  # Late import: only the benchmark tools need Pyrogram types here
+
+        self.log = log
+        self.me = User(id=bot_id, is_bot=True, first_name="Benchmark", username=username)
+        self.loop = asyncio.get_event_loop()
+        self.executor = None  # Default executor, used by Pyrogram for synchronous filters
+        self.is_connected = True
+        self.admins: Dict[Any, set] = {}  # chat_id -> user IDs reported as administrators
+        self._message_ids = itertools.count(1_000_000)
+
+    async def get_me(self):
+        self.log.record("api", "get_me")
+        return self.me
+
+    async def get_users(self, user_ids):
+        from pyrogram.types import User
+
+        self.log.record("api", "get_users")
+        if isinstance(user_ids, (list, tuple)):
+            return [User(id=user_id, first_name=f"User {user_id}") for user_id in user_ids]
+        return User(id=user_ids, first_name=f"User {user_ids}")
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.log.record("api", "get_chat_member")
+        status = "administrator" if user_id in self.admins.get(chat_id, ()) else "member"
+        return SimpleNamespace(status=status, user=SimpleNamespace(id=user_id))
+
+    def get_listener_matching_with_data(self, data, listener_type):
+        return None  # Pyrofork handlers look up conversation listeners first; there are none here
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def api_call(*args, chat_id=None, **kwargs):
+            self.log.record("api", name)
+            chat_id = chat_id if chat_id is not None else (args[0] if args else None)
+            return SimpleNamespace(id=next(self._message_ids), chat=SimpleNamespace(id=chat_id))
+        return api_call
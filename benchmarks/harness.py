@@ -0,0 +1,133 @@
+"""Drives the real plugin handlers with synthetic updates, for the benchmark tools.
+
+Import this module before anything that imports ``config``: it fills in the
+environment the bot needs to import (without overriding what is set) and
+quiets the handlers' logging.
+"""
+import inspect
+import itertools
+import logging
+import os
+import sys
+from collections import defaultdict
+from importlib import import_module
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB_NAME", "crocogame_benchmark")
+
+# Keep the handlers' INFO logging out of the measurements
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+from pyrogram import enums  # noqa: E402
+from pyrogram.handlers import CallbackQueryHandler, MessageHandler  # noqa: E402
+from pyrogram.types import CallbackQuery, Chat, Message, User  # noqa: E402
+from benchmarks.fakes import FakeClient, OperationLog, install_collections  # noqa: E402
+
+GAME_PLUGINS = ("plugins.game", "plugins.score", "plugins.start", "plugins.extra")
+
+class Router:
+    """Dispatches updates the way Pyrogram's dispatcher does.
+
+    Handlers are taken from the plugin modules in definition order and run
+    group by group; in each group the first handler whose filters pass
+    handles the update.
+    """
+
+    def __init__(self, modules: Iterable[str] = GAME_PLUGINS):
+        self.groups: Dict[int, List[Any]] = defaultdict(list)
+        for module_name in modules:
+            module = import_module(module_name)
+            for value in vars(module).values():
+                for handler, group in getattr(value, "handlers", None) or ():
+                    self.groups[group].append(handler)
+
+    @staticmethod
+    async def _passes(client, handler, update) -> bool:
+        update_filter = handler.filters
+        if update_filter is None:
+            return True
+        if inspect.iscoroutinefunction(update_filter.__call__):
+            return await update_filter(client, update)
+        return await client.loop.run_in_executor(client.executor, update_filter, client, update)
+
+    async def dispatch(self, client, update) -> List[str]:
+        """Handle an update and return the names of the handlers that ran."""
+        handler_type = MessageHandler if isinstance(update, Message) else CallbackQueryHandler
+        handled = []
+        for group in sorted(self.groups):
+            for handler in self.groups[group]:
+                if isinstance(handler, handler_type) and await self._passes(client, handler, update):
+                    handled.append(getattr(handler, "original_callback", handler.callback).__name__)
+                    await handler.callback(client, update)
+                    break
+        return handled
+
+class UpdateFactory:
+    """Builds Pyrogram messages and callback queries bound to a fake client."""
+
+    def __init__(self, client: FakeClient):
+        self.client = client
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def user(user_id: int) -> User:
+        return User(id=user_id, is_bot=False, first_name=f"User {user_id}", username=f"user{user_id}")
+
+    @staticmethod
+    def chat(chat_id: int) -> Chat:
+        if chat_id > 0:
+            return Chat(id=chat_id, type=enums.ChatType.PRIVATE, first_name=f"User {chat_id}")
+        return Chat(id=chat_id, type=enums.ChatType.SUPERGROUP, title=f"Group {chat_id}")
+
+    def message(self, chat_id: int, user_id: int, text: str, reply_to: Optional[Message] = None) -> Message:
+        return Message(
+            client=self.client,
+            id=next(self._ids),
+            chat=self.chat(chat_id),
+            from_user=self.user(user_id),
+            text=text,
+            reply_to_message=reply_to,
+        )
+
+    def callback(self, chat_id: int, user_id: int, data: str) -> CallbackQuery:
+        return CallbackQuery(
+            client=self.client,
+            id=str(next(self._ids)),
+            from_user=self.user(user_id),
+            chat_instance=str(chat_id),
+            message=self.message(chat_id, self.client.me.id, "Game"),
+            data=data,
+        )
+
+async def prepare(mongo_uri: Optional[str] = None) -> Tuple[Any, OperationLog, FakeClient]:
+    """Point the shared ``Database`` at counted collections and warm it like ``Bot.start`` does.
+
+    With ``mongo_uri`` the collections live in a real MongoDB (in the
+    MONGO_DB_NAME database, which should be a scratch one); otherwise they
+    are in memory.
+    """
+    from mongo.users_and_chats import db
+
+    log = OperationLog()
+    backend = None
+    if mongo_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        backend = AsyncIOMotorClient(mongo_uri)[os.environ["MONGO_DB_NAME"]]
+    install_collections(db, log, backend)
+    await db.load_active_games()
+    log.reset()
+    return db, log, FakeClient(log)
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
@@ -0,0 +1,183 @@
+"""End-to-end load test of the game handlers.
+
+Simulates many groups playing at once: every group gets a game, then
+synthetic guesses (a configurable share of them correct), commands and
+button presses are dispatched through the real handlers and filters of
+plugins/game.py, plugins/score.py and plugins/start.py. Telegram calls go
+to a fake client that records them, and MongoDB is an in-memory stand-in
+unless --mongo points at a (scratch) server.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test --groups 2000 --messages 50000 --rate 0
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+from collections import Counter, defaultdict
+from time import perf_counter
+from typing import Dict, List
+
+from benchmarks.harness import Router, UpdateFactory, percentile, prepare
+from benchmarks.fakes import OperationLog
+
+WRONG_GUESSES = ("apple", "river", "mountain", "lamp", "garden", "window", "pencil", "cloud")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--groups", type=int, default=1000, help="number of simulated groups")
+    parser.add_argument("--users", type=int, default=20, help="players per group")
+    parser.add_argument("--messages", type=int, default=20000, help="updates to dispatch after the warm-up")
+    parser.add_argument("--rate", type=float, default=0, help="updates per second to offer (0: as fast as possible)")
+    parser.add_argument("--correct-ratio", type=float, default=0.05, help="share of guesses that are correct")
+    parser.add_argument("--command-ratio", type=float, default=0.02, help="share of updates that are /score or /top")
+    parser.add_argument("--callback-ratio", type=float, default=0.02, help="share of updates that are host button presses")
+    parser.add_argument("--workers", type=int, default=50, help="updates handled concurrently (Bot uses 50 workers)")
+    parser.add_argument("--mongo", metavar="URI", help="use this MongoDB server instead of the in-memory stand-in")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, db, log: OperationLog, client):
+        self.args = args
+        self.db = db
+        self.log = log
+        self.client = client
+        self.router = Router()
+        self.updates = UpdateFactory(client)
+        self.random = random.Random(args.seed)
+        self.chat_ids = [-1001_000_000_000 - index for index in range(args.groups)]
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.operations: Counter = Counter()
+        self.handled: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def player(self, index: int) -> int:
+        return 10_000 + index
+
+    async def warm_up(self) -> None:
+        """Start a game in every group with /game, outside the measurement."""
+        for chat_id in self.chat_ids:
+            await self.router.dispatch(self.client, self.updates.message(chat_id, self.player(0), "/game"))
+        await self.db.score_buffer.flush()
+        self.log.reset()
+
+    def next_update(self):
+        chat_id = self.random.choice(self.chat_ids)
+        player = self.random.randrange(self.args.users)
+        user_id = self.player(player)
+        game = self.db.active_games.get(chat_id)
+        roll = self.random.random()
+
+        if roll < self.args.callback_ratio and game:
+            return "callback", self.updates.callback(chat_id, game["host"]["id"], self.random.choice(("view", "next")))
+        roll -= self.args.callback_ratio
+        if roll < self.args.command_ratio:
+            return "command", self.updates.message(chat_id, user_id, self.random.choice(("/score", "/top")))
+        if game and self.random.random() < self.args.correct_ratio:
+            if user_id == game["host"]["id"]:  # The host can't win their own round
+                user_id = self.player((player + 1) % self.args.users)
+            return "correct_guess", self.updates.message(chat_id, user_id, game["word"])
+        return "wrong_guess", self.updates.message(chat_id, user_id, self.random.choice(WRONG_GUESSES))
+
+    async def handle(self, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            kind, update = self.next_update()  # Built when it runs, so a correct guess matches the current word
+            with self.log.scope() as operations:
+                started = perf_counter()
+                try:
+                    handlers = await self.router.dispatch(self.client, update)
+                except Exception as e:
+                    self.errors[type(e).__name__] += 1
+                    handlers = []
+                self.latencies[kind].append(perf_counter() - started)
+            self.operations.update(operations)
+            self.handled.update(handlers or ["(filtered out)"])
+
+    async def run(self) -> dict:
+        await self.warm_up()
+        semaphore = asyncio.Semaphore(self.args.workers)
+        tasks = []
+        started = perf_counter()
+        for index in range(self.args.messages):
+            if self.args.rate > 0:
+                delay = started + index / self.args.rate - perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(self.handle(semaphore)))
+            if len(tasks) >= 10 * self.args.workers:  # Bound the backlog of waiting tasks
+                await asyncio.gather(*tasks)
+                tasks = []
+        await asyncio.gather(*tasks)
+        elapsed = perf_counter() - started
+
+        background = self.log.totals - self.operations  # Score flushes and other work outside the handlers
+        await self.db.score_buffer.flush()
+        return self.report(elapsed, background)
+
+    def report(self, elapsed: float, background: Counter) -> dict:
+        messages = self.args.messages
+        every = [latency for latencies in self.latencies.values() for latency in latencies]
+
+        def summary(latencies: List[float]) -> dict:
+            return {
+                "count": len(latencies),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+                "max_ms": round(max(latencies, default=0) * 1000, 3),
+            }
+
+        return {
+            "groups": self.args.groups,
+            "messages": messages,
+            "seconds": round(elapsed, 3),
+            "throughput_per_second": round(messages / elapsed, 1) if elapsed else None,
+            "latency": summary(every),
+            "latency_by_kind": {kind: summary(latencies) for kind, latencies in sorted(self.latencies.items())},
+            "db_reads_per_message": round(OperationLog.count(self.operations, "read") / messages, 4),
+            "db_writes_per_message": round(OperationLog.count(self.operations, "write") / messages, 4),
+            "telegram_calls_per_message": round(OperationLog.count(self.operations, "api") / messages, 4),
+            "background_db_writes": OperationLog.count(background, "write"),
+            "operations": {f"{kind} {name}": count for (kind, name), count in self.operations.most_common()},
+            "handled": dict(self.handled.most_common()),
+            "errors": dict(self.errors),
+        }
+
+def print_report(report: dict) -> None:
+    print(f"{report['messages']} updates across {report['groups']} groups in {report['seconds']}s: "
+          f"{report['throughput_per_second']} updates/s")
+    latency = report["latency"]
+    print(f"Handler latency: p50 {latency['p50_ms']}ms, p99 {latency['p99_ms']}ms, max {latency['max_ms']}ms")
+    for kind, latency in report["latency_by_kind"].items():
+        print(f"  {kind:<14} {latency['count']:>8}  p50 {latency['p50_ms']:>8}ms  p99 {latency['p99_ms']:>8}ms")
+    print(f"Per update: {report['db_reads_per_message']} DB reads, {report['db_writes_per_message']} DB writes, "
+          f"{report['telegram_calls_per_message']} Telegram calls")
+    print(f"Background DB writes (score flushes): {report['background_db_writes']}")
+    print("Operations:")
+    for name, count in report["operations"].items():
+        print(f"  {name:<40} {count:>8}")
+    print("Handlers:")
+    for name, count in report["handled"].items():
+        print(f"  {name:<40} {count:>8}")
+    if report["errors"]:
+        print(f"Errors: {report['errors']}")
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    db, log, client = await prepare(args.mongo)
+    db.score_buffer.start()
+    try:
+        report = await LoadTest(args, db, log, client).run()
+    finally:
+        await db.score_buffer.stop()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
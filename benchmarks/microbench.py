@@ -0,0 +1,226 @@
+"""Microbenchmarks of the per-update hot path, with a regression check.
+
+Each benchmark is timed timeit-style (auto-calibrated loop count, best of
+--repeat runs) and reported in nanoseconds per call. Every run also times a
+fixed pure-Python reference workload, and benchmarks are compared as
+multiples of it: a faster or slower machine moves the reference as much as
+the benchmarks, so the committed baseline holds on any machine running the
+same Python version. The run fails if any benchmark is more than
+--threshold slower, relative to the reference, than in the baseline.
+
+Run from the repository root:
+
+    python -m benchmarks.microbench                     # compare against benchmarks/baseline.json
+    python -m benchmarks.microbench --update-baseline   # after an intended change, then commit the file
+
+Without a baseline file the comparison run fails, so a missing baseline
+can't pass for a clean one.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.harness import prepare
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+REFERENCE = "reference[pure Python workload]"
+
+def reference_workload() -> int:
+    """Plain interpreter work (calls, loops, str and dict operations) that no code change here can speed up."""
+    counts: Dict[str, int] = {}
+    for i in range(50):
+        key = str(i % 7)
+        counts[key] = counts.get(key, 0) + len(key.upper())
+    return sum(counts.values())
+
+# name -> (function, is_async); filled by the @benchmark decorator inside build()
+Benchmarks = Dict[str, Tuple[Callable[[], Any], bool]]
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="baseline results to compare against")
+    parser.add_argument("--update-baseline", "--save-baseline", dest="update_baseline", action="store_true",
+                        help="write the results to --baseline instead of comparing")
+    parser.add_argument("--output", type=Path, help="also write the results as JSON to this file")
+    parser.add_argument("--threshold", type=float, default=0.20, help="slowdown that fails the run (0.20 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=7, help="timed runs per benchmark; the fastest counts")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds each timed run should last")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    return parser.parse_args(argv)
+
+async def build() -> Benchmarks:
+    """Set up the fixtures and return the benchmarks to run."""
+    db, _, _ = await prepare()  # Database on the in-memory stand-in
+
+    from buttons import (get_game_keyboard, get_settings_keyboard, get_language_keyboard, get_game_mode_keyboard,
+                         get_leader_keyboard, get_inline_keyboard_pm)
+    from localization import CompiledMessage
+    from script import Language, messages
+    from utils import get_message
+    from words import choice, load_words, normalize_answer, word_catalog
+
+    benchmarks: Benchmarks = {}
+
+    def benchmark(name: str):
+        def register(function):
+            benchmarks[name] = (function, asyncio.iscoroutinefunction(function))
+            return function
+        return register
+
+    # Word lists
+    easy = word_catalog.path_for(Language.EN, "easy")
+    word_catalog.get(Language.EN, "easy")
+
+    benchmark("words.load_words[easy]")(lambda: load_words(easy))
+    benchmark("words.choice[random]")(lambda: choice("easy"))
+    benchmark("words.choice[chat deck]")(lambda: choice("easy", -1001, Language.EN))
+
+    # Message rendering: every message of a language, with a value for each placeholder
+    for language in Language:
+        arguments = [(key, {field: "x" for field in CompiledMessage(key, template).fields})
+                     for key, template in messages[Language.EN].items()]
+
+        def render_all(language=language, arguments=arguments):
+            for key, kwargs in arguments:
+                get_message(language, key, **kwargs)
+        benchmark(f"utils.get_message[{language.value}, all {len(arguments)} keys]")(render_all)
+
+    # Answer comparison, as check_answer does it
+    word = "hippopotamus"
+    benchmark("check_answer.compare[wrong]")(lambda: normalize_answer("  Hippo potamus ") == normalize_answer(word))
+    benchmark("check_answer.compare[right]")(lambda: normalize_answer("HIPPOPOTAMUS") == normalize_answer(word))
+
+    # The answer_candidate filter, which runs on every group message
+    chat_id = -1002
+    db.active_games.set(chat_id, {"chat_id": chat_id, "word": word, "host": {"id": 1}})
+    benchmark("GameRegistry.might_match[reject]")(lambda: db.active_games.might_match(chat_id, "hello there"))
+    benchmark("GameRegistry.might_match[candidate]")(lambda: db.active_games.might_match(chat_id, "hippopotamuz"))
+
+    # Keyboards
+    for keyboard in (get_game_keyboard, get_settings_keyboard, get_language_keyboard, get_game_mode_keyboard,
+                     get_leader_keyboard, get_inline_keyboard_pm):
+        benchmark(f"buttons.{keyboard.__name__}")(keyboard)
+
+    # Database methods on the in-memory stand-in (their own overhead, plus the stand-in's)
+    await db.set_chat_language(chat_id, "en")
+    await db.increment_user_score(chat_id, 7, 10, 5, 20)
+
+    @benchmark("Database.get_game[registry]")
+    async def get_game():
+        await db.get_game(chat_id)
+
+    @benchmark("Database.get_chat_language[cached]")
+    async def get_chat_language():
+        await db.get_chat_language(chat_id)
+
+    @benchmark("Database.get_user_score")
+    async def get_user_score():
+        await db.get_user_score(chat_id, 7)
+
+    @benchmark("Database.increment_user_score")
+    async def increment_user_score():
+        await db.increment_user_score(chat_id, 7, 1, 1, 1)
+
+    benchmark("ScoreBuffer.add")(lambda: db.score_buffer.add(chat_id, 7, 1, 1, 1))
+    return benchmarks
+
+async def _time(function: Callable[[], Any], is_async: bool, loops: int) -> float:
+    if is_async:
+        started = perf_counter()
+        for _ in range(loops):
+            await function()
+        return perf_counter() - started
+    started = perf_counter()
+    for _ in range(loops):
+        function()
+    return perf_counter() - started
+
+async def calibrate(function: Callable[[], Any], is_async: bool, min_time: float) -> int:
+    """Return a loop count for which one timed run takes about ``min_time`` seconds, like timeit does."""
+    loops = 1
+    while True:
+        elapsed = await _time(function, is_async, loops)
+        if elapsed >= min_time / 10:
+            return max(1, int(loops * min_time / elapsed))
+        loops *= 10
+
+async def measure(benchmarks: Benchmarks, repeat: int, min_time: float) -> Dict[str, Dict[str, Any]]:
+    """Return the best time per call of each benchmark, in nanoseconds, with the loop count used.
+
+    The timed runs go round-robin over the benchmarks, so a slow patch of the
+    machine (another process, frequency scaling) hits one run of each rather
+    than every run of one.
+    """
+    loops = {name: await calibrate(function, is_async, min_time) for name, (function, is_async) in benchmarks.items()}
+    best = {name: float("inf") for name in benchmarks}
+    for _ in range(repeat):
+        for name, (function, is_async) in benchmarks.items():
+            best[name] = min(best[name], await _time(function, is_async, loops[name]))
+    return {name: {"ns_per_call": round(best[name] / loops[name] * 1e9, 1), "loops": loops[name]} for name in benchmarks}
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Print each benchmark against the baseline, relative to the reference workload, and return the names that regressed."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<48} {result['ns_per_call']:>14,.1f} ns   (new)")
+            continue
+        change = result["relative"] / reference["relative"] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<48} {result['ns_per_call']:>14,.1f} ns   {change:+7.1%}{'   REGRESSION' if regressed else ''}")
+    return regressions
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    benchmarks = await build()
+
+    selected = {name: benchmark for name, benchmark in benchmarks.items() if args.filter in name}
+    selected[REFERENCE] = (reference_workload, False)  # Always measured: the other results are relative to it
+    results = await measure(selected, args.repeat, args.min_time)
+    reference = results.pop(REFERENCE)["ns_per_call"]
+    for result in results.values():
+        result["relative"] = round(result["ns_per_call"] / reference, 4)
+
+    document = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "reference_ns": reference,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(document, indent=2) + "\n")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(document, indent=2) + "\n")
+        for name, result in results.items():
+            print(f"{name:<48} {result['ns_per_call']:>14,.1f} ns")
+        print(f"Saved the baseline to {args.baseline}.")
+        return 0
+
+    if not args.baseline.exists():
+        for name, result in results.items():
+            print(f"{name:<48} {result['ns_per_call']:>14,.1f} ns")
+        print(f"No baseline at {args.baseline}; run with --update-baseline on the reference machine to create one.")
+        return 1
+
+    baseline = json.loads(args.baseline.read_text())
+    print(f"Reference workload: {reference:,.1f} ns here, {baseline['reference_ns']:,.1f} ns in the baseline.")
+    if baseline.get("python") != document["python"]:
+        print(f"Warning: the baseline was recorded on Python {baseline.get('python')}, this is {document['python']}.")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmarks are more than {args.threshold:.0%} slower than the baseline: "
+              f"{', '.join(regressions)}")
+        return 1
+    print(f"No benchmark is more than {args.threshold:.0%} slower than the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
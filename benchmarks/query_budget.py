@@ -0,0 +1,266 @@
+"""Checks every handler against the database query budget declared in its plugin.
+
+Each plugin declares ``QUERY_BUDGETS``: for each handler, and each case it
+handles, the most database reads and writes one update may cost. This
+script plays every case through the real filters and handlers against the
+counting in-memory stand-in, prints what each update cost, and exits 1 if
+any update exceeds its budget or a declared budget has no case here. An
+update that costs less than its budget fails too: either the case doesn't
+reach the path the budget was written for, or the budget should come down.
+
+Run from the repository root:
+
+    python -m benchmarks.query_budget
+"""
+import asyncio
+import itertools
+import sys
+from importlib import import_module
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from benchmarks.harness import GAME_PLUGINS, Router, UpdateFactory, prepare
+from benchmarks.fakes import OperationLog
+from config import SUDO_USERS
+
+HOST, PLAYER, ADMIN = 20_001, 20_002, 20_003
+SUDO = SUDO_USERS[0]
+
+class Context:
+    def __init__(self, db, log: OperationLog, client, router: Router):
+        self.db = db
+        self.log = log
+        self.client = client
+        self.router = router
+        self.updates = UpdateFactory(client)
+        self._chat_ids = itertools.count(-1003_000_000_000, -1)
+
+    def new_chat(self) -> int:
+        """A chat the bot has never seen, so nothing about it is cached."""
+        chat_id = next(self._chat_ids)
+        self.client.admins[chat_id] = {ADMIN}
+        return chat_id
+
+    async def send(self, chat_id: int, user_id: int, text: str, reply_to=None) -> List[str]:
+        return await self.router.dispatch(self.client, self.updates.message(chat_id, user_id, text, reply_to))
+
+    async def press(self, chat_id: int, user_id: int, data: str) -> List[str]:
+        return await self.router.dispatch(self.client, self.updates.callback(chat_id, user_id, data))
+
+    async def game(self) -> int:
+        """A new chat with a game hosted by HOST."""
+        chat_id = self.new_chat()
+        await self.send(chat_id, HOST, "/game")
+        return chat_id
+
+    def word(self, chat_id: int) -> str:
+        return self.db.active_games.get(chat_id)["word"]
+
+# Each case prepares its chat, then returns the update to measure
+Case = Callable[[Context], Awaitable[Callable[[], Awaitable[List[str]]]]]
+CASES: Dict[Tuple[str, str], Case] = {}
+
+def case(handler: str, name: str):
+    def register(function: Case) -> Case:
+        CASES[(handler, name)] = function
+        return function
+    return register
+
+# plugins/game.py
+@case("game_command", "new game")
+async def _(ctx):
+    chat_id = ctx.new_chat()
+    return lambda: ctx.send(chat_id, HOST, "/game")
+
+@case("game_command", "game already running")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, PLAYER, "/game")
+
+@case("group_message_handler", "wrong guess")
+async def _(ctx):
+    chat_id = await ctx.game()
+    word = ctx.word(chat_id)
+    guess = word[0] + ("x" if word[-1] != "x" else "y") * (len(word) - 1)  # Passes the candidate filter
+    return lambda: ctx.send(chat_id, PLAYER, guess)
+
+@case("group_message_handler", "correct guess")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, PLAYER, ctx.word(chat_id))
+
+@case("group_message_handler", "round already won")
+async def _(ctx):
+    chat_id = await ctx.game()
+    word = ctx.word(chat_id)
+    # Another process won the round: the database moved on, this process's registry hasn't yet
+    await ctx.db.games_collection.update_one({"chat_id": chat_id}, {"$inc": {"round": 1}})
+    return lambda: ctx.send(chat_id, PLAYER, word)
+
+@case("game_action_callback", "view")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.press(chat_id, HOST, "view")
+
+@case("game_action_callback", "next")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.press(chat_id, HOST, "next")
+
+@case("game_action_callback", "end_game")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.press(chat_id, HOST, "end_game")
+
+@case("choose_leader_callback", "new leader")
+async def _(ctx):
+    chat_id = await ctx.game()
+    await ctx.press(chat_id, HOST, "end_game")
+    return lambda: ctx.press(chat_id, PLAYER, "choose_leader")
+
+@case("end_game_command", "admin ends the game")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, ADMIN, "/end")
+
+# plugins/score.py
+@case("score_command", "score")
+async def _(ctx):
+    chat_id = await ctx.game()
+    await ctx.send(chat_id, PLAYER, ctx.word(chat_id))
+    await ctx.db.score_buffer.flush()
+    return lambda: ctx.send(chat_id, PLAYER, "/score")
+
+@case("top_command", "top")
+async def _(ctx):
+    chat_id = await ctx.game()
+    await ctx.send(chat_id, PLAYER, ctx.word(chat_id))
+    return lambda: ctx.send(chat_id, PLAYER, "/top")
+
+@case("pay_command", "pay")
+async def _(ctx):
+    chat_id = await ctx.game()
+    await ctx.send(chat_id, PLAYER, ctx.word(chat_id))
+    await ctx.db.score_buffer.flush()
+    recipient = ctx.updates.message(chat_id, HOST, "hello")
+    return lambda: ctx.send(chat_id, PLAYER, "/pay 1", reply_to=recipient)
+
+# plugins/start.py
+@case("start_command", "group")
+async def _(ctx):
+    chat_id = ctx.new_chat()
+    return lambda: ctx.send(chat_id, PLAYER, "/start")
+
+@case("settings_callback", "settings")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.press(chat_id, ADMIN, "settings")
+
+@case("set_language_callback", "set language")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.press(chat_id, ADMIN, "set_language_ta")
+
+@case("set_game_mode_callback", "set game mode")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.press(chat_id, ADMIN, "set_game_mode_hard")
+
+@case("back_to_game_callback", "back to game")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.press(chat_id, ADMIN, "back_to_game")
+
+# plugins/extra.py
+@case("check_alive", "alive")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, PLAYER, "/alive")
+
+@case("check_ping", "ping")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, PLAYER, "/ping")
+
+@case("broadcast_pm_callback", "start")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, SUDO, "/broadcast_pm hello")
+
+@case("broadcast_group_callback", "start")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, SUDO, "/broadcast_group hello")
+
+@case("stats", "stats")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, SUDO, "/stats")
+
+@case("reload_words", "reload")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, SUDO, "/reloadwords")
+
+@case("cpu_profile", "stop")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, SUDO, "/profile stop")
+
+@case("memory_profile", "stop")
+async def _(ctx):
+    chat_id = await ctx.game()
+    return lambda: ctx.send(chat_id, SUDO, "/memprofile stop")
+
+def declared_budgets() -> Dict[Tuple[str, str], Dict[str, int]]:
+    budgets = {}
+    for module_name in GAME_PLUGINS:
+        for handler, cases in getattr(import_module(module_name), "QUERY_BUDGETS", {}).items():
+            for name, budget in cases.items():
+                budgets[(handler, name)] = budget
+    return budgets
+
+async def main() -> int:
+    db, log, client = await prepare()
+    ctx = Context(db, log, client, Router())
+    budgets = declared_budgets()
+    failures = []
+
+    print(f"{'handler':<24} {'case':<22} {'reads':>9} {'writes':>9}")
+    for (handler, name), prepare_case in CASES.items():
+        update = await prepare_case(ctx)
+        with log.scope() as operations:
+            handled = await update()
+        reads, writes = OperationLog.count(operations, "read"), OperationLog.count(operations, "write")
+
+        budget = budgets.get((handler, name))
+        if budget is None:
+            print(f"{handler:<24} {name:<22} {reads:>4} / -  {writes:>4} / -")
+            failures.append(f"{handler} / {name}: no budget declared in QUERY_BUDGETS")
+            continue
+        print(f"{handler:<24} {name:<22} {reads:>4} / {budget['reads']:<2} {writes:>4} / {budget['writes']:<2}")
+
+        if handler not in handled:
+            failures.append(f"{handler} / {name}: the update was handled by {handled or 'no handler'}")
+        if reads > budget["reads"] or writes > budget["writes"]:
+            costly = ", ".join(f"{kind} {operation} x{count}" for (kind, operation), count in operations.items()
+                               if kind != "api")
+            failures.append(f"{handler} / {name}: {reads} reads and {writes} writes exceed the budget of "
+                            f"{budget['reads']} reads and {budget['writes']} writes ({costly})")
+        elif reads < budget["reads"] or writes < budget["writes"]:
+            failures.append(f"{handler} / {name}: {reads} reads and {writes} writes never reach the budget of "
+                            f"{budget['reads']} reads and {budget['writes']} writes; check that the case takes "
+                            f"the path the budget covers, or lower the budget")
+
+    for handler, name in budgets.keys() - CASES.keys():
+        failures.append(f"{handler} / {name}: budget declared but no case checks it")
+
+    if failures:
+        print("\nQuery budget failures:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print(f"\nAll {len(CASES)} cases are within their query budgets.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,23 +1,34 @@
+import asyncio
 import logging
-import logging.config
 import sys
-from pyrogram import Client
-from config import API_ID, API_HASH, BOT_TOKEN, PORT, MONGO_URI, MONGO_DB_NAME, LOG_CHANNEL
-from aiohttp import web
-from plugins.web_support import web_server
-from mongo.users_and_chats import Database
-
-# Configure logging with error handling
-try:
-    logging.config.fileConfig('logging.conf')
-    logging.info("Logging configuration loaded successfully.")
-except Exception as e:
-    print(f"Error loading logging configuration: {e}")
-    logging.basicConfig(level=logging.INFO)  # Fallback to basic logging if config fails
-
-# Set logging levels
-logging.getLogger().setLevel(logging.INFO)
-logging.getLogger("pyrogram").setLevel(logging.ERROR)
+from typing import Callable
+from logging_setup import setup_logging, logging_pipeline
+
+# Configure logging before the other modules are imported, so their import-time messages go through it
+setup_logging("logging.conf")
+
+from pyrogram import Client  # noqa: E402
+from pyrogram.errors import FloodWait  # noqa: E402
+from pyrogram.handlers import DisconnectHandler  # noqa: E402
+from config import (API_ID, API_HASH, BOT_TOKEN, PORT, LOG_CHANNEL, WORDLIST_PRELOAD, WORDLIST_WATCH_INTERVAL,  # noqa: E402
+                    WATCHDOG_LAG_THRESHOLD, HANDLER_BUDGET, MAILBOX_SIZE)
+from aiohttp import web  # noqa: E402
+from plugins.web_support import web_server  # noqa: E402
+from mongo.users_and_chats import db  # noqa: E402
+from timer_wheel import game_timers  # noqa: E402
+from words import word_catalog  # noqa: E402
+from broadcast import broadcaster  # noqa: E402
+from health import health_monitor  # noqa: E402
+from metrics import time_handler, TELEGRAM_CALLS, TELEGRAM_FLOOD_WAITS, LOG_RECORDS_DISCARDED  # noqa: E402
+from watchdog import loop_watchdog  # noqa: E402
+from dispatcher import chat_dispatcher  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+LOG_RECORDS_DISCARDED.set_function(lambda: {
+    ("queue_full",): logging_pipeline.dropped,
+    ("rate_limited",): logging_pipeline.suppressed,
+})
 
 class Bot(Client):
     def __init__(self):
@@ -30,62 +41,116 @@ class Bot(Client):
             plugins={"root": "plugins"},
             sleep_threshold=5,
         )
-        self.database = Database(MONGO_URI, MONGO_DB_NAME)
+        self.database = db  # Share the instance the plugins use so in-memory state stays coherent
+        self.instrumented_handlers = 0
+
+    async def invoke(self, query, *args, **kwargs):
+        """Count every outbound Telegram API call (and the FloodWaits it hits) for /metrics."""
+        method = type(query).__name__
+        TELEGRAM_CALLS.inc(method)
+        try:
+            return await super().invoke(query, *args, **kwargs)
+        except FloodWait:
+            TELEGRAM_FLOOD_WAITS.inc(method)
+            raise
+
+    @staticmethod
+    def wrap_handler_callback(handler, wrap: Callable[[Callable], Callable]) -> None:
+        """Replace a handler's callback with ``wrap(callback)``."""
+        if hasattr(handler, "original_callback"):  # Pyrofork: callback is its listener shim, named the same for every handler
+            handler.original_callback = wrap(handler.original_callback)
+        else:
+            handler.callback = wrap(handler.callback)
+
+    def add_handler(self, handler, group: int = 0):
+        """Register a handler with its callback instrumented and, with mailboxes on, queued per chat.
+
+        Plugins are registered through here too, before the dispatcher
+        starts, so no update reaches a handler that isn't wrapped yet.
+        """
+        if not isinstance(handler, DisconnectHandler):
+            budget = HANDLER_BUDGET if HANDLER_BUDGET > 0 else None
+            self.wrap_handler_callback(handler, lambda callback: time_handler(callback, budget))
+            if MAILBOX_SIZE > 0:  # Outside the metrics wrapper, so handler latency excludes the time spent queued
+                self.wrap_handler_callback(handler, chat_dispatcher.wrap)
+            self.instrumented_handlers += 1
+        return super().add_handler(handler, group)
 
     async def start(self):
         try:
+            if WATCHDOG_LAG_THRESHOLD > 0:
+                loop_watchdog.start()  # Log what blocks the event loop, startup included
             await self.database.connect()  # Ensure MongoDB connection is established
             await self.database.initialize_database()  # Initialize the database if needed
+            await self.database.load_active_games()  # Warm the active-game registry before handling updates
+            self.database.score_buffer.start()  # Periodically flush buffered score increments
+            asyncio.ensure_future(word_catalog.preload(WORDLIST_PRELOAD))  # Load word lists in the background
+            if WORDLIST_WATCH_INTERVAL > 0:
+                asyncio.ensure_future(word_catalog.watch(WORDLIST_WATCH_INTERVAL))  # Hot-reload edited word lists
             await super().start()  # Start the bot
             me = await self.get_me()  # Get bot information
             self.mention = me.mention  # Store mention format
             self.username = me.username  # Store username
+            logger.info("Instrumented %s handlers.", self.instrumented_handlers)
+            health_monitor.start(self)  # Probe MongoDB, loop lag and the Telegram connection for /readyz
+
+            # Expire games proactively, including the ones that survived the restart
+            from plugins.game import schedule_active_games  # Imported late: the plugin is loaded by super().start()
+            scheduled = schedule_active_games(self)
+            game_timers.start()
+            logger.info("Scheduled expiry for %s active games.", scheduled)
+            await broadcaster.resume_unfinished(self)  # Pick up broadcasts interrupted by the restart
 
             # Notify log channel about the bot restart
             start_message = f"{me.first_name} ✅✅ BOT started successfully ✅✅"
-            logging.info(start_message)  # Log the bot start message
+            logger.info(start_message)  # Log the bot start message
 
             # Send message to LOG_CHANNEL after successful start
             await self.send_message(LOG_CHANNEL, start_message)
 
             # Example usage of Database
             await self.database.add_user("123", {"name": "John Doe"})
-            logging.info("User  added successfully: 123")
+            logger.info("User  added successfully: 123")
 
             user = await self.database.get_user("123")
-            logging.info(f"Retrieved user: {user}")
+            logger.info("Retrieved user: %s", user)
 
             await self.database.add_chat("456", {"title": "General Chat"})
-            logging.info("Chat added successfully: 456")
+            logger.info("Chat added successfully: 456")
 
             chat = await self.database.get_chat("456")
-            logging.info(f"Retrieved chat: {chat}")
+            logger.info("Retrieved chat: %s", chat)
 
             app = web.AppRunner(await web_server())  # Initialize the web server
             await app.setup()  # Set up the web server
             bind_address = "0.0.0.0"  # Bind to all interfaces
             await web.TCPSite(app, bind_address, PORT).start()  # Start the web server
-            logging.info(f"Web server started on {bind_address}:{PORT}")
+            logger.info("Web server started on %s:%s", bind_address, PORT)
         except Exception as e:
-            logging.error(f"Failed to start the bot: {e}")
+            logger.error("Failed to start the bot: %s", e)
             try:
                 await self.send_message(LOG_CHANNEL, f"Failed to start the bot: {e}")
             except Exception as send_error:
-                logging.error(f"Failed to send error message to log channel: {send_error}")
+                logger.error("Failed to send error message to log channel: %s", send_error)
             sys.exit(1)  # Exit if the bot fails to start
 
     async def stop(self, *args):
         try:
+            await loop_watchdog.stop()
+            await chat_dispatcher.stop()  # Stop handling queued updates before their dependencies go away
+            await health_monitor.stop()  # Stop probing before the connections close
+            await game_timers.stop()  # Stop expiring games
+            await self.database.score_buffer.stop()  # Write out buffered score increments
             await self.database.close()  # Close the MongoDB connection
             await super().stop()  # Stop the bot
-            logging.info("Bot Stopped 🙄")
+            logger.info("Bot Stopped 🙄")
             await self.send_message(LOG_CHANNEL, "Bot Stopped 🙄")
         except Exception as e:
-            logging.error(f"Failed to stop the bot: {e}")
+            logger.error("Failed to stop the bot: %s", e)
             try:
                 await self.send_message(LOG_CHANNEL, f"Failed to stop the bot: {e}")
             except Exception as send_error:
-                logging.error(f"Failed to send stop message to log channel: {send_error}")
+                logger.error("Failed to send stop message to log channel: %s", send_error)
 
 # Create an instance of the Bot and run it
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Any, Dict, Optional
+from pyrogram.errors import FloodWait
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY
+from mongo.users_and_chats import db
+from utils import get_message
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200  # Recipients sent per checkpoint
+PROGRESS_INTERVAL = 15  # Seconds between progress edits
+MAX_ATTEMPTS = 3  # Sends per recipient, FloodWait retries included
+
+class TokenBucket:
+    """Token bucket shared by every sender of a broadcast.
+
+    ``pause`` stops all senders at once, which is how a FloodWait for one
+    recipient is honoured across the whole broadcast.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self) -> None:
+        async with self._lock:  # Waiters are served in order
+            while True:
+                now = monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class BroadcastEngine:
+    """Sends a message to every user or chat, resumably.
+
+    Recipients are streamed from MongoDB in ``_id`` order and sent in batches
+    with bounded concurrency under a shared rate limit. After each batch the
+    last ``_id`` and the counters are saved to the broadcasts collection, so
+    a broadcast interrupted by a crash resumes after its last finished batch.
+    Errors are only counted per type, never kept one by one.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY):
+        self.rate = rate
+        self.concurrency = concurrency
+        self._tasks: Dict[Any, asyncio.Task] = {}
+
+    async def start(self, client, kind: str, text: str, language: str, status_message) -> Any:
+        """Create a broadcast to ``kind`` ("users" or "chats") and run it in the background."""
+        broadcast = {
+            "kind": kind,
+            "text": text,
+            "language": language,
+            "status": "running",
+            "total": await db.count_recipients(kind),
+            "success": 0,
+            "failed": 0,
+            "errors": {},
+            "last_id": None,
+            "status_chat_id": status_message.chat.id,
+            "status_message_id": status_message.id,
+            "started_at": datetime.now(timezone.utc),
+        }
+        broadcast["_id"] = await db.create_broadcast(broadcast)
+        self._spawn(client, broadcast)
+        return broadcast["_id"]
+
+    async def resume_unfinished(self, client) -> int:
+        """Resume the broadcasts that were interrupted by a restart."""
+        broadcasts = await db.get_unfinished_broadcasts()
+        for broadcast in broadcasts:
+            if broadcast["_id"] not in self._tasks:
+                logger.info("Resuming broadcast %s after %s recipients.",
+                            broadcast["_id"], broadcast["success"] + broadcast["failed"])
+                self._spawn(client, broadcast)
+        return len(broadcasts)
+
+    def _spawn(self, client, broadcast: dict) -> None:
+        task = asyncio.ensure_future(self._run(client, broadcast))
+        self._tasks[broadcast["_id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast["_id"], None))
+
+    async def _run(self, client, broadcast: dict) -> None:
+        bucket = TokenBucket(self.rate)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        errors: Dict[str, int] = {}
+        last_edit = monotonic()
+
+        async def send(target) -> bool:
+            async with semaphore:
+                return await self._send(client, bucket, target, broadcast["text"], errors)
+
+        try:
+            batch = []
+            recipients = db.iter_user_ids if broadcast["kind"] == "users" else db.iter_chat_ids
+            async for document_id, target in recipients(batch_size=BATCH_SIZE, after=broadcast["last_id"]):
+                batch.append((document_id, target))
+                if len(batch) < BATCH_SIZE:
+                    continue
+                await self._send_batch(broadcast, batch, send, errors)
+                batch = []
+                if monotonic() - last_edit >= PROGRESS_INTERVAL:
+                    await self._edit_status(client, broadcast, "broadcast_progress")
+                    last_edit = monotonic()
+            if batch:
+                await self._send_batch(broadcast, batch, send, errors)
+
+            await db.update_broadcast(broadcast["_id"], {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc)}})
+            summary_key = "broadcast_pm_success" if broadcast["kind"] == "users" else "broadcast_group_success"
+            await self._edit_status(client, broadcast, summary_key)
+            logger.info("Broadcast %s finished: %s sent, %s failed.",
+                        broadcast["_id"], broadcast["success"], broadcast["failed"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Left as "running" so the next start resumes it from the last checkpoint
+            logger.exception("Broadcast %s stopped: %s", broadcast["_id"], e)
+
+    async def _send_batch(self, broadcast: dict, batch, send, errors: Dict[str, int]) -> None:
+        results = await asyncio.gather(*(send(target) for _, target in batch))
+        sent = sum(results)
+        broadcast["success"] += sent
+        broadcast["failed"] += len(results) - sent
+        broadcast["last_id"] = batch[-1][0]
+        update: Dict[str, Any] = {
+            "$set": {"last_id": broadcast["last_id"], "success": broadcast["success"], "failed": broadcast["failed"]},
+        }
+        if errors:
+            update["$inc"] = {f"errors.{name}": count for name, count in errors.items()}
+            errors.clear()
+        await db.update_broadcast(broadcast["_id"], update)
+
+    @staticmethod
+    async def _send(client, bucket: TokenBucket, target, text: str, errors: Dict[str, int]) -> bool:
+        try:
+            target = int(target)
+        except (TypeError, ValueError):
+            errors["InvalidId"] = errors.get("InvalidId", 0) + 1
+            return False
+
+        for _ in range(MAX_ATTEMPTS):
+            await bucket.acquire()
+            try:
+                await client.send_message(target, text)
+                return True
+            except FloodWait as e:
+                wait = e.value if isinstance(e.value, (int, float)) else 1
+                logger.warning("FloodWait of %ss during broadcast; pausing all senders.", wait)
+                bucket.pause(wait)
+            except Exception as e:
+                name = type(e).__name__
+                errors[name] = errors.get(name, 0) + 1
+                logger.debug("Broadcast to %s failed: %s", target, e)
+                return False
+        errors["FloodWait"] = errors.get("FloodWait", 0) + 1
+        return False
+
+    @staticmethod
+    async def _edit_status(client, broadcast: dict, key: str) -> None:
+        pending = max(0, broadcast["total"] - broadcast["success"] - broadcast["failed"])
+        text = get_message(
+            broadcast["language"],
+            key,
+            total=broadcast["total"],
+            success=broadcast["success"],
+            failed=broadcast["failed"],
+            pending=pending,
+        )
+        try:
+            await client.edit_message_text(broadcast["status_chat_id"], broadcast["status_message_id"], text)
+        except Exception as e:
+            logger.warning("Failed to update broadcast status message: %s", e)
+
+broadcaster = BroadcastEngine()
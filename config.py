@@ -5,17 +5,13 @@ import logging
 # Load environment variables from a .env file
 load_dotenv()
 
-# Set up logging with a specific format
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+logger = logging.getLogger(__name__)
 
 def get_env_variable(var_name, default=None):
     """Retrieve an environment variable or raise an error if not found."""
     value = getenv(var_name, default)
     if value is None:
-        logging.error(f"{var_name} is not set")
+        logger.error("%s is not set", var_name)
         raise ValueError(f"{var_name} is not set")
     return value
 
@@ -34,13 +30,13 @@ SUDO_USERS = list(map(int, get_env_variable('SUDO_USERS', '2063915639').split())
 # Retrieve the port number from environment variables
 PORT = int(get_env_variable('PORT', '8080'))  # Convert to int
 if PORT <= 0:
-    logging.error("PORT must be a positive integer")
+    logger.error("PORT must be a positive integer")
     raise ValueError("PORT must be a positive integer")
 
 # Retrieve the API ID from environment variables
 API_ID = int(get_env_variable('API_ID', '1779071'))
 if API_ID <= 0:
-    logging.error("API_ID must be a positive integer")
+    logger.error("API_ID must be a positive integer")
     raise ValueError("API_ID must be a positive integer")
 
 # Retrieve the API hash from environment variables
@@ -49,5 +45,103 @@ API_HASH = get_env_variable('API_HASH', '3448177952613312689f44b9d909b5d3')
 # Retrieve the log channel ID from environment variables
 LOG_CHANNEL = int(get_env_variable('LOG_CHANNEL', '-1001566660231'))  # Default to your channel ID
 if LOG_CHANNEL == 0:
-    logging.error("LOG_CHANNEL is not set")
+    logger.error("LOG_CHANNEL is not set")
     raise ValueError("LOG_CHANNEL is not set")
+
+# Chat settings cache: maximum number of cached chats and seconds before an entry expires
+CHAT_CACHE_SIZE = int(get_env_variable('CHAT_CACHE_SIZE', '10000'))
+if CHAT_CACHE_SIZE <= 0:
+    logger.error("CHAT_CACHE_SIZE must be a positive integer")
+    raise ValueError("CHAT_CACHE_SIZE must be a positive integer")
+
+CHAT_CACHE_TTL = float(get_env_variable('CHAT_CACHE_TTL', '600'))
+
+# Per-chat word decks kept in memory: maximum number of decks and seconds an unused deck is kept
+WORD_DECK_CACHE_SIZE = int(get_env_variable('WORD_DECK_CACHE_SIZE', '10000'))
+if WORD_DECK_CACHE_SIZE <= 0:
+    logger.error("WORD_DECK_CACHE_SIZE must be a positive integer")
+    raise ValueError("WORD_DECK_CACHE_SIZE must be a positive integer")
+
+WORD_DECK_CACHE_TTL = float(get_env_variable('WORD_DECK_CACHE_TTL', '3600'))
+
+# Score write-behind buffer: seconds between flushes and number of buffered users that forces a flush
+SCORE_FLUSH_INTERVAL = float(get_env_variable('SCORE_FLUSH_INTERVAL', '5'))
+SCORE_FLUSH_THRESHOLD = int(get_env_variable('SCORE_FLUSH_THRESHOLD', '500'))
+if SCORE_FLUSH_THRESHOLD <= 0:
+    logger.error("SCORE_FLUSH_THRESHOLD must be a positive integer")
+    raise ValueError("SCORE_FLUSH_THRESHOLD must be a positive integer")
+
+# Seconds between last_active refreshes of a user or chat seen guessing (written with the score flushes)
+ACTIVITY_TOUCH_INTERVAL = float(get_env_variable('ACTIVITY_TOUCH_INTERVAL', '300'))
+
+# Seconds after which an unanswered game expires (also drives the games TTL index)
+GAME_TIMEOUT = int(get_env_variable('GAME_TIMEOUT', '300'))
+if GAME_TIMEOUT <= 0:
+    logger.error("GAME_TIMEOUT must be a positive integer")
+    raise ValueError("GAME_TIMEOUT must be a positive integer")
+
+# Extra seconds the games TTL index waits past GAME_TIMEOUT, so it only removes games the expiry timers missed
+GAME_TTL_GRACE = int(get_env_variable('GAME_TTL_GRACE', '300'))
+if GAME_TTL_GRACE < 0:
+    logger.error("GAME_TTL_GRACE must not be negative")
+    raise ValueError("GAME_TTL_GRACE must not be negative")
+
+# Only report the indexes that would be created instead of creating them
+MONGO_INDEX_DRY_RUN = get_env_variable('MONGO_INDEX_DRY_RUN', 'false').lower() in ("1", "true", "yes")
+
+# Languages whose word lists are loaded in the background at startup (others load on first use)
+WORDLIST_PRELOAD = get_env_variable('WORDLIST_PRELOAD', 'en').split()
+
+# Seconds between checks of wordlists/ for edits to hot-reload (0 disables the watcher; /reloadwords always works)
+WORDLIST_WATCH_INTERVAL = float(get_env_variable('WORDLIST_WATCH_INTERVAL', '0'))
+
+# Broadcasts: messages per second across all recipients and number of concurrent sends
+BROADCAST_RATE = float(get_env_variable('BROADCAST_RATE', '25'))
+BROADCAST_CONCURRENCY = int(get_env_variable('BROADCAST_CONCURRENCY', '10'))
+if BROADCAST_RATE <= 0 or BROADCAST_CONCURRENCY <= 0:
+    logger.error("BROADCAST_RATE and BROADCAST_CONCURRENCY must be positive")
+    raise ValueError("BROADCAST_RATE and BROADCAST_CONCURRENCY must be positive")
+
+# Seconds the user/chat/game totals shown by /stats are cached
+STATS_CACHE_TTL = float(get_env_variable('STATS_CACHE_TTL', '60'))
+
+# Health probe: seconds between probes, and the Mongo ping round-trip and event-loop lag (seconds) above which the bot is unhealthy
+HEALTH_CHECK_INTERVAL = float(get_env_variable('HEALTH_CHECK_INTERVAL', '5'))
+HEALTH_MAX_DB_LATENCY = float(get_env_variable('HEALTH_MAX_DB_LATENCY', '1'))
+HEALTH_MAX_LOOP_LAG = float(get_env_variable('HEALTH_MAX_LOOP_LAG', '1'))
+if HEALTH_CHECK_INTERVAL <= 0 or HEALTH_MAX_DB_LATENCY <= 0 or HEALTH_MAX_LOOP_LAG <= 0:
+    logger.error("HEALTH_CHECK_INTERVAL, HEALTH_MAX_DB_LATENCY and HEALTH_MAX_LOOP_LAG must be positive")
+    raise ValueError("HEALTH_CHECK_INTERVAL, HEALTH_MAX_DB_LATENCY and HEALTH_MAX_LOOP_LAG must be positive")
+
+# Loop watchdog: seconds the event loop may be blocked before its stack is logged (0 disables) and how often it is checked
+WATCHDOG_LAG_THRESHOLD = float(get_env_variable('WATCHDOG_LAG_THRESHOLD', '0.5'))
+WATCHDOG_INTERVAL = float(get_env_variable('WATCHDOG_INTERVAL', '0.1'))
+if WATCHDOG_INTERVAL <= 0:
+    logger.error("WATCHDOG_INTERVAL must be positive")
+    raise ValueError("WATCHDOG_INTERVAL must be positive")
+
+# Seconds a single handler call may take before it is logged as slow (0 disables)
+HANDLER_BUDGET = float(get_env_variable('HANDLER_BUDGET', '2'))
+
+# Profiling: seconds between CPU samples and the longest profile a command may request
+PROFILE_INTERVAL = float(get_env_variable('PROFILE_INTERVAL', '0.005'))
+PROFILE_MAX_SECONDS = float(get_env_variable('PROFILE_MAX_SECONDS', '120'))
+if PROFILE_INTERVAL <= 0 or PROFILE_MAX_SECONDS <= 0:
+    logger.error("PROFILE_INTERVAL and PROFILE_MAX_SECONDS must be positive")
+    raise ValueError("PROFILE_INTERVAL and PROFILE_MAX_SECONDS must be positive")
+
+# Token required by the /debug web endpoints (unset disables them)
+DEBUG_TOKEN = get_env_variable('DEBUG_TOKEN', '')
+
+# Per-chat dispatch: updates queued per chat (0 runs handlers directly in Pyrogram's workers), which update a full
+# mailbox drops ('oldest' or 'newest'), seconds an idle mailbox is kept, and handler calls running at once across chats
+MAILBOX_SIZE = int(get_env_variable('MAILBOX_SIZE', '100'))
+MAILBOX_OVERFLOW = get_env_variable('MAILBOX_OVERFLOW', 'oldest').lower()
+MAILBOX_IDLE_TIMEOUT = float(get_env_variable('MAILBOX_IDLE_TIMEOUT', '60'))
+DISPATCH_CONCURRENCY = int(get_env_variable('DISPATCH_CONCURRENCY', '50'))
+if MAILBOX_SIZE < 0 or MAILBOX_IDLE_TIMEOUT <= 0 or DISPATCH_CONCURRENCY <= 0:
+    logger.error("MAILBOX_SIZE must not be negative; MAILBOX_IDLE_TIMEOUT and DISPATCH_CONCURRENCY must be positive")
+    raise ValueError("MAILBOX_SIZE must not be negative; MAILBOX_IDLE_TIMEOUT and DISPATCH_CONCURRENCY must be positive")
+if MAILBOX_OVERFLOW not in ("oldest", "newest"):
+    logger.error("MAILBOX_OVERFLOW must be 'oldest' or 'newest'")
+    raise ValueError("MAILBOX_OVERFLOW must be 'oldest' or 'newest'")
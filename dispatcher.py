@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Set, Tuple
+from pyrogram import ContinuePropagation, StopPropagation
+from pyrogram.types import CallbackQuery
+from config import MAILBOX_SIZE, MAILBOX_OVERFLOW, MAILBOX_IDLE_TIMEOUT, DISPATCH_CONCURRENCY
+from metrics import describe_update, MAILBOX_DROPPED, MAILBOXES
+
+logger = logging.getLogger(__name__)
+
+# A queued handler call: the callback, its arguments and its coalescing key
+Call = Tuple[Callable, tuple, Optional[Hashable]]
+
+class Mailbox:
+    """The updates waiting for one chat, and the task working through them."""
+    __slots__ = ("calls", "keys", "wakeup", "task")
+
+    def __init__(self):
+        self.calls: Deque[Call] = deque()
+        self.keys: Set[Hashable] = set()  # Coalescing keys of the queued calls
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+class ChatDispatcher:
+    """Runs the handler calls of each chat one at a time, in the order they arrive.
+
+    Pyrogram's workers still read updates and check filters; the wrapped
+    callbacks only queue the call in the chat's mailbox and return, so a
+    busy chat never holds more than one worker. Each mailbox has a task that
+    works through it sequentially (two guesses in a group can't race each
+    other) and exits after ``idle_timeout`` seconds without updates.
+
+    A full mailbox drops its oldest or the new update, per ``overflow``, and
+    a button press already waiting from the same user is not queued twice.
+    A button press that won't run is still answered, so the user's client
+    stops showing its progress spinner.
+    Handler calls across all chats share ``concurrency`` slots; the
+    semaphore hands them out first come first served and a mailbox gives
+    its slot back after every call, so busy chats take turns with quiet ones.
+    Updates without a chat (inline queries, for example) run directly.
+
+    Since a wrapped callback returns as soon as the call is queued, Pyrogram
+    has already moved on to the update's other handler groups by the time
+    the handler runs: ``StopPropagation`` and ``ContinuePropagation`` raised
+    by a queued handler have no effect (they are logged). Handlers that rely
+    on propagation between groups must not be wrapped.
+    """
+
+    def __init__(self, size: int = MAILBOX_SIZE, overflow: str = MAILBOX_OVERFLOW,
+                 idle_timeout: float = MAILBOX_IDLE_TIMEOUT, concurrency: int = DISPATCH_CONCURRENCY):
+        self.size = size
+        self.overflow = overflow
+        self.idle_timeout = idle_timeout
+        self.concurrency = concurrency
+        self.mailboxes: Dict[int, Mailbox] = {}
+        self._slots: Optional[asyncio.Semaphore] = None  # Created on the running loop
+
+    @staticmethod
+    def coalescing_key(update: Any) -> Optional[Hashable]:
+        """Key under which queued duplicates of ``update`` collapse: repeated presses of the same button."""
+        if isinstance(update, CallbackQuery) and update.from_user:
+            return update.from_user.id, update.data
+        return None
+
+    def queued(self) -> int:
+        return sum(len(mailbox.calls) for mailbox in self.mailboxes.values())
+
+    def submit(self, chat_id: int, callback: Callable, args: tuple, key: Optional[Hashable] = None) -> bool:
+        """Queue ``callback(*args)`` for the chat; return False if the call was dropped."""
+        mailbox = self.mailboxes.get(chat_id)
+        if mailbox is None:
+            mailbox = self.mailboxes[chat_id] = Mailbox()
+            mailbox.task = asyncio.ensure_future(self._run(chat_id, mailbox))
+
+        if key is not None and key in mailbox.keys:
+            MAILBOX_DROPPED.inc("coalesced")
+            self._discard(args)
+            return False
+        if len(mailbox.calls) >= self.size:
+            MAILBOX_DROPPED.inc("overflow")
+            if self.overflow == "newest":
+                self._discard(args)
+                return False
+            _, dropped_args, dropped_key = mailbox.calls.popleft()
+            mailbox.keys.discard(dropped_key)
+            self._discard(dropped_args)
+
+        mailbox.calls.append((callback, args, key))
+        if key is not None:
+            mailbox.keys.add(key)
+        mailbox.wakeup.set()
+        return True
+
+    @staticmethod
+    def _discard(args: tuple) -> None:
+        """Answer a button press whose handler call is dropped, without waiting for Telegram."""
+        update = args[1] if len(args) > 1 else None
+        if isinstance(update, CallbackQuery):
+            asyncio.ensure_future(ChatDispatcher._answer(update))
+
+    @staticmethod
+    async def _answer(callback_query: CallbackQuery) -> None:
+        try:
+            await callback_query.answer()
+        except Exception as e:  # Already answered, too old, or the connection is gone
+            logger.debug("Could not answer dropped callback query %s: %s", callback_query.id, e)
+
+    def wrap(self, callback: Callable) -> Callable:
+        """Wrap a handler callback so its calls go through the chat's mailbox."""
+        @functools.wraps(callback)
+        async def wrapper(client, update, *args):
+            _, chat_id = describe_update(update)
+            if chat_id is None or self.size == 0:
+                return await callback(client, update, *args)
+            self.submit(chat_id, callback, (client, update, *args), self.coalescing_key(update))
+
+        return wrapper
+
+    async def _call(self, chat_id: int, callback: Callable, args: tuple) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        async with self._slots:
+            try:
+                await callback(*args)
+            except (StopPropagation, ContinuePropagation) as e:
+                # The update's other handler groups were already checked when it was queued
+                logger.warning("Handler %s raised %s in chat %s, which has no effect on a queued call",
+                               getattr(callback, "__name__", callback), type(e).__name__, chat_id)
+            except Exception:
+                logger.exception("Handler %s failed in chat %s", getattr(callback, "__name__", callback), chat_id)
+
+    async def _run(self, chat_id: int, mailbox: Mailbox) -> None:
+        try:
+            while True:
+                if not mailbox.calls:
+                    mailbox.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(mailbox.wakeup.wait(), self.idle_timeout)
+                    except asyncio.TimeoutError:
+                        if not mailbox.calls:
+                            break  # Idle: reclaim the mailbox; the next update creates a new one
+                    continue
+                callback, args, key = mailbox.calls.popleft()
+                mailbox.keys.discard(key)
+                await self._call(chat_id, callback, args)
+        finally:
+            if self.mailboxes.get(chat_id) is mailbox:
+                del self.mailboxes[chat_id]
+
+    async def stop(self) -> None:
+        """Cancel the mailbox tasks; updates still queued are dropped."""
+        tasks = [mailbox.task for mailbox in self.mailboxes.values() if mailbox.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.mailboxes.clear()
+
+chat_dispatcher = ChatDispatcher()
+
+MAILBOXES.set_function(lambda: {("open",): len(chat_dispatcher.mailboxes), ("queued",): chat_dispatcher.queued()})
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from config import HEALTH_CHECK_INTERVAL, HEALTH_MAX_DB_LATENCY, HEALTH_MAX_LOOP_LAG
+from mongo.users_and_chats import db
+
+logger = logging.getLogger(__name__)
+
+class HealthMonitor:
+    """Background probe behind the /healthz and /readyz routes.
+
+    Every ``interval`` seconds it measures how late the loop woke up from its
+    sleep (event-loop lag), pings MongoDB and reads the Pyrogram connection
+    state. The routes only read the last results, so health checks never
+    touch MongoDB or Telegram themselves.
+    """
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL, max_db_latency: float = HEALTH_MAX_DB_LATENCY,
+                 max_loop_lag: float = HEALTH_MAX_LOOP_LAG):
+        self.interval = interval
+        self.max_db_latency = max_db_latency
+        self.max_loop_lag = max_loop_lag
+        self.loop_lag = 0.0
+        self.db_latency: Optional[float] = None  # None until the first ping succeeds or after one fails
+        self.db_error: Optional[str] = None
+        self.telegram_connected = False
+        self._client = None
+        self._checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _probe_database(self) -> None:
+        try:
+            # A ping slower than the threshold is as unhealthy as a failed one, so don't wait any longer
+            self.db_latency = await asyncio.wait_for(db.ping(), timeout=self.max_db_latency)
+            self.db_error = None
+        except asyncio.TimeoutError:
+            self.db_latency, self.db_error = None, f"ping took longer than {self.max_db_latency}s"
+        except Exception as e:
+            self.db_latency, self.db_error = None, str(e) or type(e).__name__
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            before = loop.time()
+            await asyncio.sleep(self.interval)
+            self.loop_lag = max(0.0, loop.time() - before - self.interval)
+            if self.loop_lag > self.max_loop_lag:
+                logger.warning("Event loop lagged %.3fs behind schedule.", self.loop_lag)
+            await self._probe_database()
+            self.telegram_connected = bool(self._client is not None and self._client.is_connected)
+            self._checked_at = loop.time()
+
+    def start(self, client) -> None:
+        """Start probing on the running event loop; ``client`` is the Pyrogram client to watch."""
+        self._client = client
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _stale(self) -> bool:
+        # A probe that stopped reporting means the loop (or the probe) is wedged
+        if self._checked_at is None:
+            return False
+        deadline = 2 * self.interval + self.max_db_latency + self.max_loop_lag
+        return asyncio.get_event_loop().time() - self._checked_at > deadline
+
+    def liveness(self) -> Dict[str, Any]:
+        """Whether the process is making progress; failing this means it should be restarted."""
+        stale = self._stale()
+        return {
+            "ok": not stale and self.loop_lag <= self.max_loop_lag,
+            "loop_lag": round(self.loop_lag, 4),
+            "stale": stale,
+        }
+
+    def readiness(self) -> Dict[str, Any]:
+        """Whether the bot can serve updates: live, MongoDB answering in time and Telegram connected."""
+        live = self.liveness()
+        database_ok = self.db_latency is not None and self.db_latency <= self.max_db_latency
+        return {
+            "ok": self._checked_at is not None and live["ok"] and database_ok and self.telegram_connected,
+            "loop_lag": live["loop_lag"],
+            "stale": live["stale"],
+            "mongo_latency": round(self.db_latency, 4) if self.db_latency is not None else None,
+            "mongo_error": self.db_error,
+            "telegram_connected": self.telegram_connected,
+        }
+
+health_monitor = HealthMonitor()
@@ -0,0 +1,93 @@
+import logging
+from string import Formatter
+from typing import Dict, FrozenSet, Iterable, Optional, Union
+from script import messages, Language
+
+logger = logging.getLogger(__name__)
+
+class CatalogError(Exception):
+    """Custom exception for invalid message catalogs or unknown message keys."""
+    pass
+
+class CompiledMessage:
+    """A message template parsed once at startup.
+
+    Parameterless messages are rendered once and returned as is; the rest
+    keep their validated placeholder set and render through ``format_map``.
+    """
+    __slots__ = ("key", "template", "fields", "static")
+
+    def __init__(self, key: str, template: str):
+        self.key = key
+        self.template = template
+        fields = set()
+        for _, field_name, _, _ in Formatter().parse(template):
+            if field_name is None:
+                continue
+            if not field_name.isidentifier():
+                raise CatalogError(f"Message '{key}' uses unsupported placeholder '{{{field_name}}}'.")
+            fields.add(field_name)
+        self.fields: FrozenSet[str] = frozenset(fields)
+        self.static: Optional[str] = template.format() if not fields else None
+
+    def render(self, kwargs: Dict[str, object]) -> str:
+        if self.static is not None:
+            return self.static
+        missing = self.fields.difference(kwargs)
+        if missing:
+            raise CatalogError(f"Message '{self.key}' is missing values for {', '.join(sorted(missing))}.")
+        return self.template.format_map(kwargs)
+
+class MessageCatalog:
+    """Localized messages compiled from ``script.messages``.
+
+    Every language resolves every key: a key missing from a translation falls
+    back to the ``fallback`` language. Translations must use the same
+    placeholders as the fallback, which is checked at construction so broken
+    catalogs fail at startup instead of at render time.
+    """
+
+    def __init__(self, sources: Dict[Language, Dict[str, str]], fallback: Language = Language.EN):
+        if fallback not in sources:
+            raise CatalogError(f"Fallback language {fallback.name} has no messages.")
+        self.fallback = fallback
+        base = {key: CompiledMessage(key, template) for key, template in sources[fallback].items()}
+
+        self._compiled: Dict[Language, Dict[str, CompiledMessage]] = {}
+        for language in Language:
+            compiled = dict(base)
+            for key, template in sources.get(language, {}).items():
+                message = CompiledMessage(key, template)
+                if key in base and message.fields != base[key].fields:
+                    raise CatalogError(
+                        f"Message '{key}' in {language.name} uses {sorted(message.fields)}, "
+                        f"but {fallback.name} uses {sorted(base[key].fields)}."
+                    )
+                compiled[key] = message
+            untranslated = base.keys() - sources.get(language, {}).keys()
+            if untranslated:
+                logger.info("%s falls back to %s for: %s.",
+                            language.name, fallback.name, ", ".join(sorted(untranslated)))
+            self._compiled[language] = compiled
+
+        # Resolve both enum members and their string codes without constructing an enum per call
+        self._languages: Dict[object, Language] = {language: language for language in Language}
+        self._languages.update({language.value: language for language in Language})
+
+    def require(self, keys: Iterable[str]) -> None:
+        """Fail fast if any of ``keys`` has no message in the fallback language."""
+        missing = [key for key in keys if key not in self._compiled[self.fallback]]
+        if missing:
+            raise CatalogError(f"Missing messages: {', '.join(missing)}.")
+
+    def render(self, language: Union[Language, str], key: str, /, **kwargs) -> str:
+        """Render a message in the given language (enum member or code); unknown languages use the fallback."""
+        compiled = self._compiled[self._languages.get(language, self.fallback)]
+        try:
+            message = compiled[key]
+        except KeyError:
+            raise CatalogError(f"Unknown message key '{key}'.") from None
+        return message.render(kwargs)
+
+# Compiled once at import, so an invalid catalog stops the bot at startup
+catalog = MessageCatalog(messages)
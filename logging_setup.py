@@ -0,0 +1,212 @@
+import atexit
+import configparser
+import json
+import logging
+import logging.config
+import logging.handlers
+import queue
+import random
+import threading
+import traceback
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+# Attributes every LogRecord has; anything else on a record came from ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line, for log collectors.
+
+    Select it for a handler in logging.conf (``formatter=jsonFormatter``).
+    Values passed with ``extra=`` are included as fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            document["exception"] = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        elif record.exc_text:
+            document["exception"] = record.exc_text
+        if record.stack_info:
+            document["stack"] = record.stack_info
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                document[key] = value
+        return json.dumps(document, default=str, ensure_ascii=False)
+
+class RateLimitFilter(logging.Filter):
+    """Caps how many records below WARNING each logger may emit.
+
+    ``rate_limits`` maps a logger name to the records per second it may log
+    (a token bucket that holds up to one second's worth); ``sampling`` maps a
+    logger name to the share of its records to keep. Both apply to the named
+    logger and its children, the most specific name winning. Warnings and
+    errors always pass. When a logger is let through again after dropping
+    records, the record says how many were suppressed.
+    """
+
+    def __init__(self, rate_limits: Optional[Dict[str, float]] = None, sampling: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rate_limits = rate_limits or {}
+        self.sampling = sampling or {}
+        self.suppressed = 0
+        self._buckets: Dict[str, List[float]] = {}  # logger name -> [tokens, last refill]
+        self._dropped: Dict[str, int] = {}
+        self._rules: Dict[str, Tuple[Optional[float], Optional[float]]] = {}  # logger name -> (rate, share)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _closest(settings: Dict[str, float], name: str) -> Optional[float]:
+        while True:
+            if name in settings:
+                return settings[name]
+            if "." not in name:
+                return settings.get("root")
+            name = name.rsplit(".", 1)[0]
+
+    def _rule(self, name: str) -> Tuple[Optional[float], Optional[float]]:
+        rule = self._rules.get(name)
+        if rule is None:
+            rule = self._rules[name] = (self._closest(self.rate_limits, name), self._closest(self.sampling, name))
+        return rule
+
+    def _allow(self, name: str, rate: Optional[float], share: Optional[float]) -> bool:
+        if share is not None and random.random() >= share:
+            return False
+        if rate is None:
+            return True
+        now = monotonic()
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = [rate, now]
+        bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate, share = self._rule(record.name)
+        if rate is None and share is None:
+            return True
+
+        with self._lock:
+            if not self._allow(record.name, rate, share):
+                self._dropped[record.name] = self._dropped.get(record.name, 0) + 1
+                self.suppressed += 1
+                return False
+            dropped = self._dropped.pop(record.name, 0)
+        if dropped and isinstance(record.msg, str):
+            record.msg += f" [{dropped} similar messages suppressed]"
+        return True
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without formatting them.
+
+    The standard QueueHandler formats every record in the calling thread so
+    it can be pickled; these records stay in the process, so the listener's
+    handlers format them instead (so arguments are rendered a moment after
+    the call). When the queue is full the record is dropped (and counted)
+    rather than blocking the event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LoggingPipeline:
+    """Routes every log record through a queue to a background listener thread.
+
+    ``setup`` applies logging.conf with ``fileConfig``, then moves the
+    handlers it attached to the root logger behind a ``QueueListener``: the
+    root logger keeps a single queue handler, so logging from the event loop
+    costs a filter check and a queue put, and formatting and writing to the
+    stream happen on the listener's thread. The ``[pipeline]`` section of
+    logging.conf sets the queue size and the per-logger rate limits.
+    """
+
+    def __init__(self):
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.queue_handler: Optional[BackgroundQueueHandler] = None
+        self.rate_limiter: Optional[RateLimitFilter] = None
+
+    @staticmethod
+    def _parse_settings(value: str) -> Dict[str, float]:
+        """Parse ``name=number`` pairs separated by commas or new lines."""
+        settings = {}
+        for item in value.replace("\n", ",").split(","):
+            if item.strip():
+                name, _, number = item.partition("=")
+                settings[name.strip()] = float(number)
+        return settings
+
+    def setup(self, path: str = "logging.conf") -> None:
+        parser = configparser.ConfigParser()
+        if not parser.read(path):
+            raise FileNotFoundError(f"Logging configuration {path} not found")
+        logging.config.fileConfig(parser, disable_existing_loggers=False)
+
+        pipeline = parser["pipeline"] if parser.has_section("pipeline") else {}
+        root = logging.getLogger()
+        handlers = root.handlers[:]
+        if not handlers:
+            return
+
+        self.stop()
+        self.queue_handler = BackgroundQueueHandler(queue.Queue(int(pipeline.get("queue_size", 10000))))
+        self.rate_limiter = RateLimitFilter(self._parse_settings(pipeline.get("rate_limits", "")),
+                                            self._parse_settings(pipeline.get("sampling", "")))
+        self.queue_handler.addFilter(self.rate_limiter)
+        for handler in handlers:
+            root.removeHandler(handler)
+        root.addHandler(self.queue_handler)
+
+        self.listener = logging.handlers.QueueListener(self.queue_handler.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Write out the records still queued and stop the listener thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    @property
+    def dropped(self) -> int:
+        """Records lost because the queue was full."""
+        return self.queue_handler.dropped if self.queue_handler else 0
+
+    @property
+    def suppressed(self) -> int:
+        """Records held back by the rate limits and sampling."""
+        return self.rate_limiter.suppressed if self.rate_limiter else 0
+
+logging_pipeline = LoggingPipeline()
+
+def setup_logging(path: str = "logging.conf") -> None:
+    """Configure logging from ``path``, falling back to a plain console setup if that fails."""
+    try:
+        logging_pipeline.setup(path)
+    except Exception as e:
+        print(f"Error loading logging configuration: {e}")
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+        logging.getLogger("pyrogram").setLevel(logging.ERROR)
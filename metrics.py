@@ -0,0 +1,210 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Only what the bot needs is implemented: labelled counters, histograms and
+gauges whose value is read from a callback at scrape time.
+"""
+import asyncio
+import functools
+import inspect
+import logging
+from bisect import bisect_left
+from time import perf_counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in self._values.items()]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # labels -> bucket counts + [+Inf, sum]
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1  # Non-cumulative here, summed when rendering
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Gauge(Metric):
+    """Gauge whose labelled values are produced by a callback when scraped."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """Set the callback returning ``{labelvalues: value}`` (use ``()`` for an unlabelled gauge)."""
+        self._function = function
+
+    def render(self) -> List[str]:
+        if self._function is None:
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in self._function().items()]
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+HANDLER_LATENCY = registry.register(Histogram(
+    "bot_handler_latency_seconds", "Wall time spent in each Pyrogram handler.", ("handler",)))
+HANDLER_ERRORS = registry.register(Counter(
+    "bot_handler_errors_total", "Handler calls that raised an exception.", ("handler",)))
+DB_OPERATIONS = registry.register(Counter(
+    "bot_db_operations_total", "Calls to each Database method.", ("method",)))
+DB_LATENCY = registry.register(Histogram(
+    "bot_db_operation_latency_seconds", "Latency of each Database method.", ("method",)))
+CACHE_HIT_RATIO = registry.register(Gauge(
+    "bot_cache_hit_ratio", "Hit ratio of the in-process caches since startup.", ("cache",)))
+ACTIVE_GAMES = registry.register(Gauge(
+    "bot_active_games", "Games currently running."))
+TELEGRAM_CALLS = registry.register(Counter(
+    "bot_telegram_api_calls_total", "Outbound Telegram API calls by method.", ("method",)))
+TELEGRAM_FLOOD_WAITS = registry.register(Counter(
+    "bot_telegram_flood_waits_total", "FloodWait errors raised by Telegram by method.", ("method",)))
+SLOW_HANDLERS = registry.register(Counter(
+    "bot_slow_handlers_total", "Handler calls that ran over their wall-time budget.", ("handler",)))
+MAILBOX_DROPPED = registry.register(Counter(
+    "bot_mailbox_dropped_total", "Updates dropped from per-chat mailboxes, by reason.", ("reason",)))
+MAILBOXES = registry.register(Gauge(
+    "bot_mailboxes", "Per-chat mailboxes and the updates queued in them.", ("state",)))
+LOG_RECORDS_DISCARDED = registry.register(Gauge(
+    "bot_log_records_discarded", "Log records discarded since startup, by reason.", ("reason",)))
+
+class HandlerCall(NamedTuple):
+    """The handler a task is running, kept so stalls can be attributed to it."""
+    handler: str
+    update_type: str
+    chat_id: Optional[int]
+    started: float
+
+# Handlers in flight, by the task running them
+active_handlers: Dict[asyncio.Task, HandlerCall] = {}
+
+def describe_update(update: Any) -> Tuple[str, Optional[int]]:
+    """Return the update type and chat ID of a Message or CallbackQuery."""
+    chat = getattr(update, "chat", None)
+    if chat is None:  # Callback queries carry their chat on the message they belong to
+        chat = getattr(getattr(update, "message", None), "chat", None)
+    return type(update).__name__, getattr(chat, "id", None)
+
+def time_handler(callback: Callable, budget: Optional[float] = None) -> Callable:
+    """Wrap a Pyrogram handler callback to record its latency and failures.
+
+    Calls running longer than ``budget`` seconds are logged with their update
+    type and chat ID.
+    """
+    name = f"{callback.__module__}.{callback.__name__}"
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = perf_counter()
+        update_type, chat_id = describe_update(args[1]) if len(args) > 1 else ("unknown", None)
+        task = asyncio.current_task()
+        active_handlers[task] = HandlerCall(name, update_type, chat_id, started)
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            active_handlers.pop(task, None)
+            elapsed = perf_counter() - started
+            HANDLER_LATENCY.observe(elapsed, name)
+            if budget is not None and elapsed > budget:
+                SLOW_HANDLERS.inc(name)
+                logger.warning("Slow handler %s: %.3fs on %s in chat %s (budget %ss).",
+                               name, elapsed, update_type, chat_id, budget)
+
+    return wrapper
+
+def instrument_db_methods(cls):
+    """Class decorator counting and timing every public coroutine method of a Database class."""
+    for attribute, method in list(vars(cls).items()):
+        if attribute.startswith("_") or not inspect.iscoroutinefunction(method):
+            continue
+
+        def wrap(method, name=attribute):
+            @functools.wraps(method)
+            async def wrapper(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    DB_OPERATIONS.inc(name)
+                    DB_LATENCY.observe(perf_counter() - started, name)
+            return wrapper
+
+        setattr(cls, attribute, wrap(method))
+    return cls
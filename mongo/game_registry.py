@@ -0,0 +1,87 @@
+import logging
+from typing import Dict, Any, Optional, Iterable, Tuple
+from words import normalize_answer
+
+logger = logging.getLogger(__name__)
+
+class GameRegistry:
+    """Process-local view of the active games, keyed by chat ID.
+
+    The registry is written through by ``Database`` on every game change and
+    warm loaded from ``games_collection`` at startup, so once ``loaded`` is set
+    it is authoritative and game lookups never need to touch MongoDB.
+    """
+
+    def __init__(self):
+        self._games: Dict[Any, dict] = {}
+        self._answer_keys: Dict[Any, Tuple[int, str]] = {}  # chat_id -> (length, first character) of the answer
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def __contains__(self, chat_id) -> bool:
+        return chat_id in self._games
+
+    def load(self, games: Iterable[dict]) -> int:
+        """Replace the registry contents with the given game documents."""
+        self._games = {game["chat_id"]: game for game in games if "chat_id" in game}
+        self._answer_keys = {}
+        for chat_id, game in self._games.items():
+            self._index_answer(chat_id, game)
+        self.loaded = True
+        logger.info("Loaded %s active games into the registry.", len(self._games))
+        return len(self._games)
+
+    def get(self, chat_id) -> Optional[dict]:
+        """Return the active game for a chat, or None if there is none."""
+        return self._games.get(chat_id)
+
+    def set(self, chat_id, game_data: Dict[str, Any]) -> None:
+        """Merge game data into the chat's game, creating it if needed (mirrors an upserted $set)."""
+        game = dict(self._games.get(chat_id) or {"chat_id": chat_id})
+        game.update(game_data)
+        self._games[chat_id] = game
+        self._index_answer(chat_id, game)
+
+    def update(self, chat_id, update_data: Dict[str, Any]) -> None:
+        """Merge data into an existing game (mirrors a non-upserted $set)."""
+        game = self._games.get(chat_id)
+        if game is None:
+            return
+        game = dict(game)
+        game.update(update_data)
+        self._games[chat_id] = game
+        self._index_answer(chat_id, game)
+
+    def remove(self, chat_id) -> None:
+        """Forget the chat's game."""
+        self._games.pop(chat_id, None)
+        self._answer_keys.pop(chat_id, None)
+
+    def might_match(self, chat_id, text: str) -> bool:
+        """Cheaply tell whether ``text`` could be the chat's answer.
+
+        Only the normalized length and first character are compared; a True
+        result still needs a full comparison. Before the registry is loaded
+        nothing can be ruled out.
+        """
+        if not self.loaded:
+            return True
+        key = self._answer_keys.get(chat_id)
+        if key is None:
+            return False
+        guess = normalize_answer(text)
+        return len(guess) == key[0] and guess[:1] == key[1]
+
+    def _index_answer(self, chat_id, game: dict) -> None:
+        word = game.get("word")
+        if isinstance(word, str):
+            answer = normalize_answer(word)
+            self._answer_keys[chat_id] = (len(answer), answer[:1])
+        else:
+            self._answer_keys.pop(chat_id, None)
+
+    def chat_ids(self):
+        """Return a snapshot of the chat IDs with an active game."""
+        return list(self._games)
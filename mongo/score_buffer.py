@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Callable, Awaitable, Tuple, TypeVar
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError, ConfigurationError, InvalidOperation
+
+logger = logging.getLogger(__name__)
+
+SCORE_FIELDS = ("score", "coins", "xp")
+
+# Errors raised before any operation reaches the server, so a batch that hits them can safely be requeued
+NOT_WRITTEN_ERRORS = (ServerSelectionTimeoutError, ConfigurationError, InvalidOperation)
+
+T = TypeVar("T")
+
+class ScoreBuffer:
+    """Write-behind buffer that coalesces score increments per (chat_id, user_id).
+
+    Increments accumulate in memory and are flushed as one unordered
+    ``bulk_write`` of upserted ``$inc`` operations, either every
+    ``flush_interval`` seconds or as soon as ``max_pending`` entries are
+    buffered. Readers overlay ``pending`` on what MongoDB returns so pending
+    points are never invisible; a batch being written stays in that overlay
+    until MongoDB acknowledges it. Reads that are overlaid go through
+    ``read_consistent`` so they never overlap a flush.
+
+    The same flushes write the ``last_active`` times passed to ``touch``,
+    to the collection of each kind in ``activity_collections``.
+    """
+
+    def __init__(self, collection, flush_interval: float, max_pending: int,
+                 activity_collections: Optional[Dict[str, Any]] = None):
+        self.collection = collection
+        self.activity_collections = activity_collections or {}
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Any, Dict[Any, dict]] = {}  # chat_id -> user_id -> entry
+        self._inflight: Dict[Any, Dict[Any, dict]] = {}  # The batch being written, until it is acknowledged
+        self._touches: Dict[Tuple[str, Any], datetime] = {}  # (kind, item_id) -> last_active
+        self._size = 0
+        self._generation = 0  # Incremented whenever a flush takes a batch
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._threshold_flush: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, chat_id, user_id, score: int, coins: int, xp: int,
+            defaults: Optional[Dict[str, Any]] = None) -> None:
+        """Buffer an increment; it is merged with any pending one for the same user."""
+        self._merge(chat_id, user_id, {"score": score, "coins": coins, "xp": xp}, defaults)
+        if self._size >= self.max_pending and (self._threshold_flush is None or self._threshold_flush.done()):
+            self._threshold_flush = asyncio.ensure_future(self.flush())
+
+    def _merge(self, chat_id, user_id, deltas: Dict[str, int], defaults: Optional[Dict[str, Any]]) -> None:
+        chat_entries = self._pending.setdefault(chat_id, {})
+        entry = chat_entries.get(user_id)
+        if entry is None:
+            entry = chat_entries[user_id] = {"score": 0, "coins": 0, "xp": 0, "defaults": {}}
+            self._size += 1
+        for field in SCORE_FIELDS:
+            entry[field] += deltas[field]
+        if defaults:
+            entry["defaults"].update(defaults)
+
+    def touch(self, kind: str, item_id, at: datetime) -> None:
+        """Buffer a ``last_active`` refresh of a user or chat ("user" or "chat")."""
+        key = (kind, item_id)
+        if key not in self._touches or self._touches[key] < at:
+            self._touches[key] = at
+
+    @staticmethod
+    def _combine(entries: List[Optional[dict]]) -> Optional[dict]:
+        entries = [entry for entry in entries if entry is not None]
+        if len(entries) < 2:
+            return entries[0] if entries else None
+        combined = {field: sum(entry[field] for entry in entries) for field in SCORE_FIELDS}
+        combined["defaults"] = {key: value for entry in entries for key, value in entry["defaults"].items()}
+        return combined
+
+    def pending(self, chat_id, user_id) -> Optional[dict]:
+        """Return the not yet written increments for a user, if any."""
+        return self._combine([self._inflight.get(chat_id, {}).get(user_id), self._pending.get(chat_id, {}).get(user_id)])
+
+    def pending_for_chat(self, chat_id) -> Dict[Any, dict]:
+        """Return the not yet written increments for every user of a chat."""
+        inflight, pending = self._inflight.get(chat_id, {}), self._pending.get(chat_id, {})
+        return {user_id: self._combine([inflight.get(user_id), pending.get(user_id)])
+                for user_id in inflight.keys() | pending.keys()}
+
+    async def read_consistent(self, read: Callable[[], Awaitable[T]]) -> T:
+        """Run a MongoDB read of scores so that no flush overlaps it.
+
+        While a batch is being written MongoDB may or may not show it yet,
+        so overlaying ``pending`` on a read made then could drop or double
+        count its points. The read waits for a flush in flight and is
+        retried if another flush starts before it returns; overlay
+        ``pending`` right after it, without awaiting in between.
+        """
+        while True:
+            while self._flush_lock.locked():
+                async with self._flush_lock:
+                    pass
+            generation = self._generation
+            result = await read()
+            if generation == self._generation:
+                return result
+
+    async def flush(self) -> int:
+        """Write every buffered increment to MongoDB. Returns the number of entries written."""
+        async with self._flush_lock:
+            await self._flush_touches()
+            if not self._pending:
+                return 0
+            batch, self._pending, self._size = self._pending, {}, 0
+            self._inflight = batch
+            self._generation += 1
+
+            keys: List[tuple] = []
+            operations: List[UpdateOne] = []
+            for chat_id, chat_entries in batch.items():
+                for user_id, entry in chat_entries.items():
+                    update: Dict[str, Any] = {"$inc": {field: entry[field] for field in SCORE_FIELDS}}
+                    if entry["defaults"]:
+                        update["$setOnInsert"] = entry["defaults"]
+                    keys.append((chat_id, user_id))
+                    operations.append(UpdateOne({"chat_id": chat_id, "user_id": user_id}, update, upsert=True))
+
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+                logger.debug("Flushed %s buffered score updates.", len(operations))
+                return len(operations)
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                logger.error("%s of %s buffered score updates failed; requeueing them.", len(failed), len(operations))
+                self._requeue(batch, [keys[i] for i in failed])
+                return len(operations) - len(failed)
+            except NOT_WRITTEN_ERRORS as e:
+                logger.error("Failed to flush buffered score updates, requeueing them: %s", e)
+                self._requeue(batch, keys)
+                return 0
+            except Exception as e:
+                # The batch may have been applied with only the acknowledgement lost; requeueing could count it twice
+                logger.error("Flushing %s buffered score updates failed with an unknown outcome; not retrying them: %s",
+                             len(operations), e)
+                return 0
+            finally:
+                self._inflight = {}
+
+    async def _flush_touches(self) -> None:
+        touches, self._touches = self._touches, {}
+        operations: Dict[str, List[UpdateOne]] = {}
+        for (kind, item_id), at in touches.items():
+            query: Dict[str, Any] = {f"{kind}_id": item_id}
+            if kind == "user":
+                query["chat_id"] = {"$exists": False}  # The user document, not its per-chat score entries
+            # $max keeps a later time already written, so a requeued refresh never moves last_active back
+            operations.setdefault(kind, []).append(UpdateOne(query, {"$max": {"last_active": at}}))
+
+        for kind, kind_operations in operations.items():
+            try:
+                await self.activity_collections[kind].bulk_write(kind_operations, ordered=False)
+            except NOT_WRITTEN_ERRORS as e:
+                logger.error("Failed to flush %s last_active updates, requeueing them: %s", kind, e)
+                for (touched_kind, item_id), at in touches.items():
+                    if touched_kind == kind:
+                        self.touch(kind, item_id, at)
+            except Exception as e:
+                logger.error("Failed to flush %s last_active updates: %s", kind, e)
+
+    def _requeue(self, batch: Dict[Any, Dict[Any, dict]], keys: List[tuple]) -> None:
+        for chat_id, user_id in keys:
+            entry = batch[chat_id][user_id]
+            self._merge(chat_id, user_id, entry, entry["defaults"])
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Unexpected error in score flush loop: %s", e)
+
+    def start(self) -> None:
+        """Start the periodic flush task on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush task and write out whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from time import time, monotonic
+from typing import Dict, Optional
+from config import STATS_CACHE_TTL
+from mongo.users_and_chats import db
+
+logger = logging.getLogger(__name__)
+
+class ActivityCounter:
+    """Per-minute event counts over a rolling window, kept in a fixed ring of buckets.
+
+    Recording is O(1) and nothing is ever scanned in the database; counts
+    cover this process only and start from zero after a restart.
+    """
+
+    def __init__(self, window_minutes: int = 24 * 60):
+        self.window_minutes = window_minutes
+        self._counts = [0] * window_minutes
+        self._minutes = [-1] * window_minutes  # Which minute each bucket currently holds
+
+    def record(self, count: int = 1, now: Optional[float] = None) -> None:
+        minute = int((time() if now is None else now) // 60)
+        index = minute % self.window_minutes
+        if self._minutes[index] != minute:
+            self._minutes[index] = minute
+            self._counts[index] = 0
+        self._counts[index] += count
+
+    def total(self, seconds: int, now: Optional[float] = None) -> int:
+        """Return the number of events in the last ``seconds`` (rounded to whole minutes)."""
+        minute = int((time() if now is None else now) // 60)
+        oldest = minute - min(self.window_minutes, max(1, seconds // 60)) + 1
+        return sum(count for count, stamp in zip(self._counts, self._minutes) if oldest <= stamp <= minute)
+
+class StatsService:
+    """Statistics for /stats: cached collection totals plus live activity rollups.
+
+    Totals come from ``estimated_document_count`` (collection metadata, no
+    scan), are fetched concurrently and cached for ``cache_ttl`` seconds.
+    Activity is counted in memory as games start and get answered.
+    """
+
+    def __init__(self, database, cache_ttl: float = STATS_CACHE_TTL):
+        self.database = database
+        self.cache_ttl = cache_ttl
+        self.games_started = ActivityCounter()
+        self.games_answered = ActivityCounter()
+        self._totals: Optional[Dict[str, int]] = None
+        self._totals_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+
+    async def get_totals(self) -> Dict[str, int]:
+        """Return the user, chat and game totals, refreshing them when the cache is stale."""
+        if self._totals is not None and monotonic() - self._totals_at < self.cache_ttl:
+            return self._totals
+        async with self._refresh_lock:  # Concurrent /stats calls share one refresh
+            if self._totals is None or monotonic() - self._totals_at >= self.cache_ttl:
+                user_count, chat_count, game_count = await asyncio.gather(
+                    self.database.get_user_count(),
+                    self.database.get_chat_count(),
+                    self.database.get_game_count(),
+                )
+                self._totals = {"user_count": user_count, "chat_count": chat_count, "game_count": game_count}
+                self._totals_at = monotonic()
+                logger.info("Refreshed stats totals: %s", self._totals)
+        return self._totals
+
+    def get_activity(self) -> Dict[str, int]:
+        """Return the live activity rollups."""
+        now = time()
+        return {
+            "active_games": len(self.database.active_games),
+            "started_hour": self.games_started.total(3600, now),
+            "started_day": self.games_started.total(86400, now),
+            "answered_hour": self.games_answered.total(3600, now),
+            "answered_day": self.games_answered.total(86400, now),
+        }
+
+stats_service = StatsService(db)
@@ -1,8 +1,19 @@
 import logging
-from typing import Dict, Any, Optional, List
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Dict, Any, Optional, List, AsyncIterator, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
-from config import MONGO_URI, MONGO_DB_NAME
-from pymongo.errors import ServerSelectionTimeoutError, ConfigurationError
+from config import (MONGO_URI, MONGO_DB_NAME, CHAT_CACHE_SIZE, CHAT_CACHE_TTL, SCORE_FLUSH_INTERVAL,
+                    SCORE_FLUSH_THRESHOLD, GAME_TIMEOUT, GAME_TTL_GRACE, MONGO_INDEX_DRY_RUN,
+                    ACTIVITY_TOUCH_INTERVAL)
+from pymongo import ReturnDocument, IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import ServerSelectionTimeoutError, ConfigurationError, OperationFailure
+from mongo.game_registry import GameRegistry
+from mongo.cache import TTLCache
+from mongo.score_buffer import ScoreBuffer, SCORE_FIELDS
+from metrics import instrument_db_methods, ACTIVE_GAMES, CACHE_HIT_RATIO
+
+logger = logging.getLogger(__name__)
 
 class UserNotFoundError(Exception):
     """Custom exception for user not found errors."""
@@ -16,6 +27,28 @@ class DatabaseConnectionError(Exception):
     """Custom exception for database connection errors."""
     pass
 
+# Indexes every collection needs, keyed by collection name
+INDEXES: Dict[str, List[IndexModel]] = {
+    "chats": [
+        IndexModel([("chat_id", ASCENDING)], name="chat_id_unique", unique=True),
+    ],
+    "games": [
+        IndexModel([("chat_id", ASCENDING)], name="chat_id_unique", unique=True),
+        # Safety net, not the expiry path: the game timers expire rounds after GAME_TIMEOUT (see plugins/game.py).
+        # The grace period covers the TTL monitor's 60s sweeps, late timer ticks and clock skew, so this only
+        # drops games whose timer never fired, e.g. ones left behind by a crash
+        IndexModel([("started_at", ASCENDING)], name="started_at_ttl", expireAfterSeconds=GAME_TIMEOUT + GAME_TTL_GRACE),
+    ],
+    "users": [
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        # Per-chat score entries; plain user documents have no chat_id and are left out
+        IndexModel([("chat_id", ASCENDING), ("user_id", ASCENDING)], name="chat_id_user_id_unique", unique=True,
+                   partialFilterExpression={"chat_id": {"$exists": True}}),
+        IndexModel([("chat_id", ASCENDING), ("score", DESCENDING)], name="chat_id_score_desc"),
+    ],
+}
+
+@instrument_db_methods  # Per-method call counts and latencies for /metrics
 class Database:
     def __init__(self, uri: str, database_name: str):
         self.client = AsyncIOMotorClient(uri)
@@ -23,25 +56,38 @@ class Database:
         self.users_collection: AsyncIOMotorCollection = self.database.users
         self.chats_collection: AsyncIOMotorCollection = self.database.chats
         self.games_collection: AsyncIOMotorCollection = self.database.games
-        logging.info(f"MongoDB client initialized at {uri}, database: {database_name}")
+        self.broadcasts_collection: AsyncIOMotorCollection = self.database.broadcasts
+        self.active_games = GameRegistry()  # Write-through cache of games_collection
+        self.chat_cache = TTLCache(CHAT_CACHE_SIZE, CHAT_CACHE_TTL)  # Chat settings documents
+        self.score_buffer = ScoreBuffer(self.users_collection, SCORE_FLUSH_INTERVAL, SCORE_FLUSH_THRESHOLD,
+                                        {"user": self.users_collection, "chat": self.chats_collection})
+        # Users and chats whose last_active was refreshed lately; evicting one only costs an early refresh
+        self.activity_cache = TTLCache(CHAT_CACHE_SIZE, ACTIVITY_TOUCH_INTERVAL)
+        logger.info("MongoDB client initialized at %s, database: %s", uri, database_name)
 
     async def connect(self) -> None:
         """Connect to the MongoDB database."""
         try:
             await self.client.admin.command('ping')
-            logging.info(f"Successfully connected to MongoDB at {MONGO_URI}, database: {MONGO_DB_NAME}")
+            logger.info("Successfully connected to MongoDB at %s, database: %s", MONGO_URI, MONGO_DB_NAME)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             raise DatabaseConnectionError(f"Failed to connect to MongoDB: {e}")
 
+    async def ping(self) -> float:
+        """Ping MongoDB and return the round-trip time in seconds."""
+        started = perf_counter()
+        await self.client.admin.command('ping')
+        return perf_counter() - started
+
     async def close(self) -> None:
         """Close the database connection."""
         await self.client.close()  # Ensure to await the close operation
-        logging.info("Database connection closed.")
+        logger.info("Database connection closed.")
 
     async def initialize_database(self) -> None:
         """Initialize the database by creating a default user or chat if none exist."""
         # Check if any users exist
-        user_count = await self.users_collection.count_documents({})
+        user_count = await self.users_collection.estimated_document_count()  # Metadata lookup, no collection scan
         if user_count == 0:
             default_user = {
                 "user_id": "default_user",
@@ -51,10 +97,10 @@ class Database:
                 "xp": 0
             }
             await self.users_collection.insert_one(default_user)
-            logging.info("Default user created in the database.")
+            logger.info("Default user created in the database.")
 
         # Check if any chats exist
-        chat_count = await self.chats_collection.count_documents({})
+        chat_count = await self.chats_collection.estimated_document_count()  # Metadata lookup, no collection scan
         if chat_count == 0:
             default_chat = {
                 "chat_id": "default_chat",
@@ -63,42 +109,98 @@ class Database:
                 "game_mode": ["easy"]
             }
             await self.chats_collection.insert_one(default_chat)
-            logging.info("Default chat created in the database.")
+            logger.info("Default chat created in the database.")
+
+        await self.ensure_indexes(dry_run=MONGO_INDEX_DRY_RUN)
+
+    async def ensure_indexes(self, dry_run: bool = False) -> List[Dict[str, str]]:
+        """Create missing indexes and align the games TTL with GAME_TIMEOUT plus GAME_TTL_GRACE.
+
+        Returns one report entry per index with its status: ``exists``,
+        ``created``, ``updated``, ``conflict`` or ``failed`` (prefixed with
+        ``would be`` in dry-run mode, where nothing is changed).
+        """
+        report = []
+        for collection_name, indexes in INDEXES.items():
+            collection = self.database[collection_name]
+            existing = await collection.index_information()
+            for index in indexes:
+                spec = index.document
+                name = spec["name"]
+                current = existing.get(name)
+                if current is None:
+                    status = "created"
+                elif list(current["key"]) != list(spec["key"].items()):
+                    status = "conflict"  # Same name, different keys: needs a manual decision
+                elif "expireAfterSeconds" in spec and current.get("expireAfterSeconds") != spec["expireAfterSeconds"]:
+                    status = "updated"
+                else:
+                    status = "exists"
+
+                if dry_run and status in ("created", "updated"):
+                    status = f"would be {status}"
+                elif status == "created":
+                    try:
+                        await collection.create_indexes([index])
+                    except OperationFailure as e:
+                        logger.error("Failed to create index %s on %s: %s", name, collection_name, e)
+                        status = "failed"
+                elif status == "updated":
+                    try:
+                        await self.database.command(
+                            "collMod", collection_name,
+                            index={"name": name, "expireAfterSeconds": spec["expireAfterSeconds"]}
+                        )
+                    except OperationFailure as e:
+                        logger.error("Failed to update TTL of index %s on %s: %s", name, collection_name, e)
+                        status = "failed"
+
+                report.append({"collection": collection_name, "index": name, "status": status})
+
+        for entry in report:
+            level = logging.INFO if entry["status"] in ("exists", "created", "updated") else logging.WARNING
+            logger.log(level, "Index %s.%s: %s", entry["collection"], entry["index"], entry["status"])
+        return report
+
+    async def load_active_games(self) -> int:
+        """Warm load every stored game into the in-memory registry."""
+        games = await self.games_collection.find({}).to_list(length=None)
+        return self.active_games.load(games)
 
     async def get_user_count(self) -> int:
         """Retrieve the count of users in the database."""
         try:
-            count = await self.users_collection.count_documents({})
-            logging.info(f"Total users count: {count}")
+            count = await self.users_collection.estimated_document_count()  # Metadata lookup, no collection scan
+            logger.info("Total users count: %s", count)
             return count
         except Exception as e:
-            logging.error(f"Error getting user count: {e}")
+            logger.error("Error getting user count: %s", e)
             return 0  # Return 0 if there's an error
 
     async def get_chat_count(self) -> int:
         """Retrieve the count of chats in the database."""
         try:
-            count = await self.chats_collection.count_documents({})
-            logging.info(f"Total chats count: {count}")
+            count = await self.chats_collection.estimated_document_count()  # Metadata lookup, no collection scan
+            logger.info("Total chats count: %s", count)
             return count
         except Exception as e:
-            logging.error(f"Error getting chat count: {e}")
+            logger.error("Error getting chat count: %s", e)
             return 0  # Return 0 if there's an error
 
     async def get_game_count(self) -> int:
         """Retrieve the count of games in the database."""
         try:
-            count = await self.games_collection.count_documents({})
-            logging.info(f"Total games count: {count}")
+            count = await self.games_collection.estimated_document_count()  # Metadata lookup, no collection scan
+            logger.info("Total games count: %s", count)
             return count
         except Exception as e:
-            logging.error(f"Error getting game count: {e}")
+            logger.error("Error getting game count: %s", e)
             return 0  # Return 0 if there's an error
 
     async def handle_db_error(self, action: str, identifier: str, e: Exception) -> None:
         """Handle database errors by logging and raising a custom exception."""
         log_message = f"Failed to {action} for {identifier}: {e}"
-        logging.error(log_message, exc_info=e)
+        logger.error(log_message, exc_info=e)
         raise DatabaseConnectionError(log_message)
 
     # User management methods
@@ -106,13 +208,13 @@ class Database:
         """Add a new user to the database."""
         existing_user = await self.users_collection.find_one({"user_id": user_id})
         if existing_user:
-            logging.info(f"User  {user_id} already exists in the database. Skipping addition.")
+            logger.debug("User  %s already exists in the database. Skipping addition.", user_id)
             return
 
         user = {"user_id": user_id, **user_data}
         try:
             await self.users_collection.insert_one(user)
-            logging.info(f"User  {user_id} added to the database.")
+            logger.info("User  %s added to the database.", user_id)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("add user", user_id, e)
 
@@ -132,27 +234,76 @@ class Database:
                 {"$set": game_data},
                 upsert=True
             )
-            logging.info(f"Game for chat {chat_id} has been set/updated.")
+            self.active_games.set(chat_id, game_data)
+            logger.debug("Game for chat %s has been set/updated.", chat_id)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("set game", chat_id, e)
 
+    async def claim_round(self, chat_id: str, round_number: Optional[int], word: str,
+                          next_game: Dict[str, Any]) -> Optional[dict]:
+        """Atomically end the chat's current round and start the next one with ``next_game``.
+
+        The update only matches while the game is still on ``round_number``
+        with ``word``, so of several concurrent winners exactly one gets the
+        new game back; the others get None. Games stored before rounds were
+        numbered have no ``round`` field, which a None ``round_number`` matches.
+        """
+        try:
+            game = await self.games_collection.find_one_and_update(
+                {"chat_id": chat_id, "round": round_number, "word": word},
+                {"$set": next_game, "$inc": {"round": 1}},
+                return_document=ReturnDocument.AFTER
+            )
+        except (ServerSelectionTimeoutError, ConfigurationError) as e:
+            await self.handle_db_error("claim round", chat_id, e)
+        if game is not None:
+            self.active_games.set(chat_id, game)
+        return game
+
     async def get_game(self, chat_id: str) -> Optional[dict]:
         """Retrieve the game data for a specific chat."""
+        if self.active_games.loaded:
+            return self.active_games.get(chat_id)  # The registry is authoritative once loaded
         try:
             game = await self.games_collection.find_one({"chat_id": chat_id})
             return game
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
-            logging.error(f"Failed to get game for {chat_id}: {e}")
+            logger.error("Failed to get game for %s: %s", chat_id, e)
             return None
 
     async def remove_game(self, chat_id: str) -> None:
         """Remove the game data for a specific chat."""
         try:
             await self.games_collection.delete_one({"chat_id": chat_id})
-            logging.info(f"Game for chat {chat_id} has been removed.")
+            self.active_games.remove(chat_id)
+            logger.debug("Game for chat %s has been removed.", chat_id)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("remove game", chat_id, e)
 
+    async def expire_round(self, chat_id: str, round_number: Optional[int]) -> bool:
+        """Remove the chat's game only if it is still on ``round_number``; return whether it was removed.
+
+        A winner may have started the next round just before the round's
+        timer fired, and that round must survive the expiry. If the games TTL
+        index deleted the document first, the round still counts as expired,
+        so the registry doesn't keep a game that no longer exists.
+        """
+        try:
+            result = await self.games_collection.delete_one({"chat_id": chat_id, "round": round_number})
+            if not result.deleted_count:
+                game = self.active_games.get(chat_id)
+                if game is None or game.get("round") != round_number:
+                    return False  # A newer round replaced it
+                # Nothing was deleted but the registry is still on this round: either the TTL index got there
+                # first or a claim of the next round hasn't been acknowledged yet, and only the latter leaves a document
+                if await self.games_collection.find_one({"chat_id": chat_id}, {"round": 1}) is not None:
+                    return False
+        except (ServerSelectionTimeoutError, ConfigurationError) as e:
+            await self.handle_db_error("expire round", chat_id, e)
+        self.active_games.remove(chat_id)
+        logger.debug("Round %s of the game in chat %s expired.", round_number, chat_id)
+        return True
+
     async def update_game(self, chat_id: str, update_data: Dict[str, Any]) -> None:
         """Update the game data for a specific chat."""
         try:
@@ -160,7 +311,8 @@ class Database:
                 {"chat_id": chat_id},
                 {"$set": update_data}
             )
-            logging.info(f"Game for chat {chat_id} has been updated.")
+            self.active_games.update(chat_id, update_data)
+            logger.debug("Game for chat %s has been updated.", chat_id)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("update game", chat_id, e)
 
@@ -169,20 +321,25 @@ class Database:
         """Add a new chat to the database."""
         existing_chat = await self.chats_collection.find_one({"chat_id": chat_id})
         if existing_chat:
-            logging.info(f"Chat {chat_id} already exists in the database. Skipping addition.")
+            logger.debug("Chat %s already exists in the database. Skipping addition.", chat_id)
             return
 
         chat = {"chat_id": chat_id, **chat_data}
         try:
             await self.chats_collection.insert_one(chat)
-            logging.info(f"Chat {chat_id} added to the database.")
+            self.chat_cache.invalidate(chat_id)
+            logger.info("Chat %s added to the database.", chat_id)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("add chat", chat_id, e)
 
     async def get_chat(self, chat_id: str) -> Optional[dict]:
-        """Retrieve a chat from the database by chat ID."""
+        """Retrieve a chat from the database by chat ID, going through the settings cache."""
+        found, chat = self.chat_cache.get(chat_id)
+        if found:
+            return chat
         try:
             chat = await self.chats_collection.find_one({"chat_id": chat_id})
+            self.chat_cache.set(chat_id, chat)  # Missing chats are cached too, as None
             return chat
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("get chat", chat_id, e)
@@ -196,7 +353,8 @@ class Database:
                 {"$set": {"title": chat_title}},
                 upsert=True
             )
-            logging.info(f"Chat {chat_id} title updated to {chat_title}.")
+            self.chat_cache.invalidate(chat_id)
+            logger.info("Chat %s title updated to %s.", chat_id, chat_title)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("update chat", chat_id, e)
 
@@ -212,15 +370,29 @@ class Database:
         }
         try:
             await self.users_collection.insert_one(user_score)
-            logging.info(f"User  {user_id} score added to chat {chat_id}.")
+            logger.debug("User  %s score added to chat %s.", user_id, chat_id)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
              await self.handle_db_error("add user score", user_id, e)
 
     async def get_user_score(self, chat_id: str, user_id: str) -> Optional[dict]:
-        """Retrieve a user's score, coins, and XP from the database."""
-        user_score = await self.users_collection.find_one({"chat_id": chat_id, "user_id": user_id})
+        """Retrieve a user's score, coins, and XP, including increments not yet flushed."""
+        user_score = await self.score_buffer.read_consistent(
+            lambda: self.users_collection.find_one({"chat_id": chat_id, "user_id": user_id}))
+        pending = self.score_buffer.pending(chat_id, user_id)
         if user_score is None:
-            raise UserNotFoundError(f"User  {user_id} not found in chat {chat_id}.")
+            if pending is None:
+                raise UserNotFoundError(f"User  {user_id} not found in chat {chat_id}.")
+            user_score = {"chat_id": chat_id, "user_id": user_id, **pending["defaults"]}
+        return self._apply_pending(user_score, pending)
+
+    @staticmethod
+    def _apply_pending(user_score: dict, pending: Optional[dict]) -> dict:
+        """Return a copy of a score entry with buffered increments added."""
+        if pending is None:
+            return user_score
+        user_score = dict(user_score)
+        for field in SCORE_FIELDS:
+            user_score[field] = user_score.get(field, 0) + pending[field]
         return user_score
 
     async def update_user_score(self, chat_id: str, user_id: str, score: int, coins: int, xp: int) -> None:
@@ -235,24 +407,65 @@ class Database:
                 }},
                 upsert=True  # Create a new entry if it doesn't exist
             )
-            logging.info(f"User  {user_id} score updated in chat {chat_id}.")
+            logger.debug("User  %s score updated in chat %s.", user_id, chat_id)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("update user score", user_id, e)
 
-    async def increment_user_score(self, chat_id: str, user_id: str, score: int, coins: int, xp: int) -> None:
-        """Increment the user's score, coins, and XP in the database."""
-        user_score = await self.get_user_score(chat_id, user_id)
-
-        new_score = user_score['score'] + score
-        new_coins = user_score['coins'] + coins
-        new_xp = user_score['xp'] + xp
-
-        await self.update_user_score(chat_id, user_id, new_score, new_coins, new_xp)
+    def touch_activity(self, user_id: str, chat_id: str) -> None:
+        """Refresh the last_active time of a user and the chat they wrote in.
+
+        Each is refreshed at most once per ACTIVITY_TOUCH_INTERVAL, and the
+        write goes out with the next score flush instead of a query per message.
+        """
+        now = datetime.now(timezone.utc)
+        for kind, item_id in (("user", user_id), ("chat", chat_id)):
+            found, _ = self.activity_cache.get((kind, item_id))
+            if not found:
+                self.activity_cache.set((kind, item_id), True)
+                self.score_buffer.touch(kind, item_id, now)
+
+    async def increment_user_score(self, chat_id: str, user_id: str, score: int, coins: int, xp: int,
+                                   defaults: Optional[Dict[str, Any]] = None) -> Optional[dict]:
+        """Atomically increment the user's score, coins, and XP, creating the entry if needed.
+
+        This is a single upserted ``$inc`` round trip, so concurrent awards are never lost.
+        ``defaults`` are only written when the entry is created. Returns the updated entry.
+        """
+        update: Dict[str, Any] = {"$inc": {"score": score, "coins": coins, "xp": xp}}
+        if defaults:
+            update["$setOnInsert"] = {k: v for k, v in defaults.items() if k not in update["$inc"]}
+        try:
+            return await self.users_collection.find_one_and_update(
+                {"chat_id": chat_id, "user_id": user_id},
+                update,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except (ServerSelectionTimeoutError, ConfigurationError) as e:
+            await self.handle_db_error("increment user score", user_id, e)
 
     async def get_top_users(self, chat_id: str, limit: int = 10) -> List[dict]:
-        """Retrieve the top users based on their scores in a specific chat."""
-        top_users = await self.users_collection.find({"chat_id": chat_id}).sort("score", -1).limit(limit).to_list()
-        return top_users
+        """Retrieve the top users based on their scores in a specific chat, including buffered increments."""
+        async def read_top_users() -> Dict[str, dict]:
+            pending = self.score_buffer.pending_for_chat(chat_id)
+            # Pending entries can move up or (after a payment) down, so fetch enough stored users to re-rank
+            top_users = await self.users_collection.find({"chat_id": chat_id}).sort("score", -1).limit(limit + len(pending)).to_list(length=None)
+            ranked = {user["user_id"]: user for user in top_users}
+            looked_up = set(ranked)
+            missing = [user_id for user_id in pending if user_id not in looked_up]
+            while missing:  # Repeated only for users who got points during the previous read
+                looked_up.update(missing)
+                async for user in self.users_collection.find({"chat_id": chat_id, "user_id": {"$in": missing}}):
+                    ranked[user["user_id"]] = user
+                missing = [user_id for user_id in self.score_buffer.pending_for_chat(chat_id) if user_id not in looked_up]
+            return ranked
+
+        ranked = await self.score_buffer.read_consistent(read_top_users)
+        pending = self.score_buffer.pending_for_chat(chat_id)  # Read again: increments may have been added meanwhile
+        for user_id, entry in pending.items():
+            stored = ranked.get(user_id) or {"chat_id": chat_id, "user_id": user_id, **entry["defaults"]}
+            ranked[user_id] = self._apply_pending(stored, entry)
+        return sorted(ranked.values(), key=lambda user: user.get("score", 0), reverse=True)[:limit]
 
     # Group language management methods
     async def set_chat_language(self, chat_id: str, language: str) -> None:
@@ -263,7 +476,8 @@ class Database:
                 {"$set": {"language": language}},
                 upsert=True
             )
-            logging.info(f"Chat {chat_id} language set to {language}.")
+            self.chat_cache.invalidate(chat_id)  # Settings changes must take effect immediately
+            logger.info("Chat %s language set to %s.", chat_id, language)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("set language", chat_id, e)
 
@@ -275,6 +489,36 @@ class Database:
         else:
             return "en"
 
+    # Word deck persistence methods
+    async def save_word_deck(self, chat_id: str, language: str, game_mode: str, state: Dict[str, int]) -> None:
+        """Persist a chat's word deck position so it survives restarts."""
+        try:
+            result = await self.chats_collection.update_one(
+                {"chat_id": chat_id},
+                {"$set": {f"word_decks.{language}.{game_mode}": state}},
+                upsert=True
+            )
+        except (ServerSelectionTimeoutError, ConfigurationError) as e:
+            await self.handle_db_error("save word deck", chat_id, e)
+
+        # Mirror the write in the cached chat, so a deck evicted from memory is restored at this position
+        # (get_word_deck reads through the cache) without costing the settings reads their cache hits
+        found, chat = self.chat_cache.get(chat_id)
+        if found and chat is not None:
+            chat.setdefault("word_decks", {}).setdefault(language, {})[game_mode] = state
+        elif found and result.upserted_id is not None:  # A cached "chat not found": this write created the chat
+            self.chat_cache.set(chat_id, {"_id": result.upserted_id, "chat_id": chat_id,
+                                          "word_decks": {language: {game_mode: state}}})
+        elif found:
+            self.chat_cache.invalidate(chat_id)  # The chat was created meanwhile; read it back
+
+    async def get_word_deck(self, chat_id: str, language: str, game_mode: str) -> Optional[Dict[str, int]]:
+        """Get the persisted word deck of a chat for a language and game mode."""
+        chat = await self.get_chat(chat_id)
+        if chat:
+            return chat.get("word_decks", {}).get(language, {}).get(game_mode)
+        return None
+
     # Group game mode management methods
     async def set_group_game_mode(self, chat_id: str, game_modes: List[str]) -> None:
         """Set the game mode for a specific chat."""
@@ -284,7 +528,8 @@ class Database:
                 {"$set": {"game_mode": game_modes}},  # Store as a LIST
                 upsert=True
             )
-            logging.info(f"Chat {chat_id} game mode set to {game_modes}.")
+            self.chat_cache.invalidate(chat_id)  # Settings changes must take effect immediately
+            logger.info("Chat %s game mode set to %s.", chat_id, game_modes)
         except (ServerSelectionTimeoutError, ConfigurationError) as e:
             await self.handle_db_error("set game mode", chat_id, e)
 
@@ -296,5 +541,84 @@ class Database:
         else:
             return ["easy"]  # Return a LIST
 
+    # Bulk iteration methods
+    @staticmethod
+    def user_query(active_since: Optional[datetime] = None, query: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build the query selecting user documents (score entries, which also carry user_id, are excluded).
+
+        A caller's ``query`` narrows the selection; it is combined with ``$and`` so it can't replace a condition.
+        """
+        conditions = {"user_id": {"$exists": True}, "chat_id": {"$exists": False}}
+        if active_since is not None:
+            conditions["last_active"] = {"$gte": active_since}
+        return {"$and": [conditions, query]} if query else conditions
+
+    @staticmethod
+    def chat_query(language: Optional[str] = None, query: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build the query selecting chat documents, optionally only those using a language.
+
+        A caller's ``query`` narrows the selection; it is combined with ``$and`` so it can't replace a condition.
+        """
+        conditions: Dict[str, Any] = {"chat_id": {"$exists": True}}
+        if language == "en":
+            conditions["$or"] = [{"language": "en"}, {"language": {"$exists": False}}]  # English is the default
+        elif language is not None:
+            conditions["language"] = language
+        return {"$and": [conditions, query]} if query else conditions
+
+    async def _iter_ids(self, collection: AsyncIOMotorCollection, field: str, query: Dict[str, Any],
+                        after: Any, batch_size: int) -> AsyncIterator[Tuple[Any, Any]]:
+        if after is not None:
+            query = {**query, "_id": {"$gt": after}}
+        cursor = collection.find(query, {field: 1}).sort("_id", ASCENDING).batch_size(batch_size)
+        async for document in cursor:
+            if field in document:
+                yield document["_id"], document[field]
+
+    def iter_user_ids(self, batch_size: int = 500, after: Any = None, active_since: Optional[datetime] = None,
+                      query: Optional[Dict[str, Any]] = None) -> AsyncIterator[Tuple[Any, Any]]:
+        """Stream ``(_id, user_id)`` pairs of user documents in ``_id`` order, in constant memory.
+
+        Pass the last ``_id`` seen as ``after`` to resume an interrupted walk.
+        """
+        return self._iter_ids(self.users_collection, "user_id", self.user_query(active_since, query), after, batch_size)
+
+    def iter_chat_ids(self, batch_size: int = 500, after: Any = None, language: Optional[str] = None,
+                      query: Optional[Dict[str, Any]] = None) -> AsyncIterator[Tuple[Any, Any]]:
+        """Stream ``(_id, chat_id)`` pairs of chat documents in ``_id`` order, in constant memory.
+
+        Pass the last ``_id`` seen as ``after`` to resume an interrupted walk.
+        """
+        return self._iter_ids(self.chats_collection, "chat_id", self.chat_query(language, query), after, batch_size)
+
+    async def count_recipients(self, kind: str) -> int:
+        """Count the broadcast recipients of a kind ("users" or "chats")."""
+        if kind == "users":
+            return await self.users_collection.count_documents(self.user_query())
+        return await self.chats_collection.count_documents(self.chat_query())
+
+    # Broadcast progress methods
+    async def create_broadcast(self, broadcast: Dict[str, Any]) -> Any:
+        """Store a new broadcast and return its ID."""
+        try:
+            result = await self.broadcasts_collection.insert_one(broadcast)
+            return result.inserted_id
+        except (ServerSelectionTimeoutError, ConfigurationError) as e:
+            await self.handle_db_error("create broadcast", str(broadcast.get("kind")), e)
+
+    async def update_broadcast(self, broadcast_id: Any, update: Dict[str, Any]) -> None:
+        """Apply an update document to a stored broadcast."""
+        try:
+            await self.broadcasts_collection.update_one({"_id": broadcast_id}, update)
+        except (ServerSelectionTimeoutError, ConfigurationError) as e:
+            await self.handle_db_error("update broadcast", str(broadcast_id), e)
+
+    async def get_unfinished_broadcasts(self) -> List[dict]:
+        """Return the broadcasts that were still running when the bot stopped."""
+        return await self.broadcasts_collection.find({"status": "running"}).to_list(length=None)
+
 # Create a database instance (but don't connect yet)
 db = Database(MONGO_URI, MONGO_DB_NAME)
+
+ACTIVE_GAMES.set_function(lambda: {(): len(db.active_games)})
+CACHE_HIT_RATIO.set_function(lambda: {("chat_settings",): db.chat_cache.stats()["hit_ratio"]})
@@ -1,6 +1,8 @@
 # plugins/ai_plugin.py
 
+import asyncio
 import os
+from functools import partial
 import openai
 
 # Set your OpenAI API key from environment variables
@@ -8,7 +10,9 @@ openai.api_key = os.environ.get("OPENAI_API_KEY")  # Ensure this is set in your
 
 # Function to interact with OpenAI API
 async def ai(query):
-    response = openai.Completion.create(
+    # The OpenAI client is synchronous; run it in the executor so it doesn't block every game
+    request = partial(
+        openai.Completion.create,
         engine="text-davinci-002",
         prompt=query,
         max_tokens=100,
@@ -17,6 +21,7 @@ async def ai(query):
         temperature=0.9,
         timeout=5
     )
+    response = await asyncio.get_event_loop().run_in_executor(None, request)
     return response.choices[0].text.strip()
 
 # Function to handle AI queries
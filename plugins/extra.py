@@ -1,18 +1,43 @@
 # extra.py
-import logging
 import asyncio
+import logging
+from datetime import datetime, timezone
+from io import BytesIO
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from mongo.users_and_chats import db
-from config import SUDO_USERS
+from config import SUDO_USERS, LOG_CHANNEL
 from utils import get_message
 from script import Language  # Import Language enum
+from words import word_catalog
+from localization import catalog
+from broadcast import broadcaster
+from mongo.stats import stats_service
+from profiling import profiler
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 CMD = ["/", "."]
 
+catalog.require((
+    "alive", "ping", "provide_message", "broadcast_progress", "broadcast_pm_success", "broadcast_group_success", "stats",
+    "stats_activity",
+))
+
+# Most MongoDB reads and writes one update may cost, per handler and case (checked by benchmarks/query_budget.py).
+# Chat settings come from the settings cache here; a cache miss adds one read.
+QUERY_BUDGETS = {
+    "check_alive": {"alive": {"reads": 0, "writes": 0}},
+    "check_ping": {"ping": {"reads": 0, "writes": 0}},
+    # Recipient count + the broadcast document; the sends run in the background
+    "broadcast_pm_callback": {"start": {"reads": 1, "writes": 1}},
+    "broadcast_group_callback": {"start": {"reads": 1, "writes": 1}},
+    "stats": {"stats": {"reads": 3, "writes": 0}},  # Estimated user, chat and game counts, cached for STATS_CACHE_TTL
+    "reload_words": {"reload": {"reads": 0, "writes": 0}},
+    "cpu_profile": {"stop": {"reads": 0, "writes": 0}},
+    "memory_profile": {"stop": {"reads": 0, "writes": 0}},
+}
+
 @Client.on_message(filters.command("alive", CMD))
 async def check_alive(_, message):
     language_str = await db.get_chat_language(message.chat.id)
@@ -20,8 +45,8 @@ async def check_alive(_, message):
         language = Language(language_str)
     except ValueError:
         language = Language.EN
-    logging.info(f"Alive command received from {message.from_user.first_name} in chat {message.chat.id}.")
-    await message.reply_text(await get_message(language, "alive"))
+    logger.info("Alive command received from %s in chat %s.", message.from_user.first_name, message.chat.id)
+    await message.reply_text(get_message(language, "alive"))
 
 @Client.on_message(filters.command("ping", CMD))
 async def check_ping(_, message):
@@ -30,95 +55,29 @@ async def check_ping(_, message):
         language = Language(language_str)
     except ValueError:
         language = Language.EN
-    await message.reply_text(await get_message(language, "ping"))
-
-@Client.on_message(filters.command("broadcast_pm", CMD) & filters.user(SUDO_USERS))
-async def broadcast_pm_callback(Client, Message):
-    if len(message.command) < 2:
-        language = await db.get_chat_language(message.chat.id)
-        await message.reply_text(await get_message(language, "provide_message"))
-        return
-
-    broadcast_message = " ".join(message.command[1:])
-    user_ids = await db.get_all_user_ids()
-
-    total_users = len(user_ids)
-    success_count = 0
-    fail_count = 0
-    error_messages = []  # Store error messages
-
-    for user_id in user_ids:
-        try:
-            await client.send_message(user_id, broadcast_message)
-            success_count += 1
-            await asyncio.sleep(0.1)  # Rate limiting
-        except Exception as e:
-            logging.error(f"Failed to send message to user {user_id}: {e}")
-            fail_count += 1
-            error_messages.append(f"Failed to send to {user_id}: {e}")  # Add error details
-
-    pending_count = total_users - (success_count + fail_count)
+    await message.reply_text(get_message(language, "ping"))
 
+async def start_broadcast(client, message, kind: str):
+    """Start a background broadcast to every user or chat, reporting progress by editing one message."""
     language = await db.get_chat_language(message.chat.id)
-    summary_message = await get_message(
-        language,
-        "broadcast_pm_success",
-        total=total_users,
-        success=success_count,
-        failed=fail_count,
-        pending=pending_count,
-    )
-
-    if error_messages:
-        summary_message += "\n\nErrors:\n" + "\n".join(error_messages)  # Include error details
-
-    await message.reply_text(summary_message)
-
-
-
-@Client.on_message(filters.command("broadcast_group", CMD) & filters.user(SUDO_USERS))
-async def broadcast_group_callback(Client, Message):
     if len(message.command) < 2:
-        language = await db.get_chat_language(message.chat.id)
-        await message.reply_text(await get_message(language, "provide_message"))
+        await message.reply_text(get_message(language, "provide_message"))
         return
 
-    broadcast_message = " ".join(message.command[1:])
-    group_ids = await db.get_all_group_ids()
-
-    total_groups = len(group_ids)
-    success_count = 0
-    fail_count = 0
-    error_messages = []
-
-    for group_id in group_ids:
-        try:
-            await client.send_message(group_id, broadcast_message)
-            success_count += 1
-            await asyncio.sleep(0.1)  # Rate limiting
-        except Exception as e:
-            logging.error(f"Failed to send message to group {group_id}: {e}")
-            fail_count += 1
-            error_messages.append(f"Failed to send to {group_id}: {e}")
-
-    pending_count = total_groups - (success_count + fail_count)
-
-    language = await db.get_chat_language(message.chat.id)
-    summary_message = await get_message(
-        language,
-        "broadcast_group_success",
-        total=total_groups,
-        success=success_count,
-        failed=fail_count,
-        pending=pending_count,
+    broadcast_message = message.text.split(None, 1)[1]  # Keep the original spacing and line breaks
+    status_message = await message.reply_text(
+        get_message(language, "broadcast_progress", total="…", success=0, failed=0, pending="…")
     )
+    broadcast_id = await broadcaster.start(client, kind, broadcast_message, language, status_message)
+    logger.info("Broadcast %s to %s started by %s.", broadcast_id, kind, message.from_user.id)
 
-    if error_messages:
-        summary_message += "\n\nErrors:\n" + "\n".join(error_messages)
-
-    await message.reply_text(summary_message)
-
+@Client.on_message(filters.command("broadcast_pm", CMD) & filters.user(SUDO_USERS))
+async def broadcast_pm_callback(client, message):
+    await start_broadcast(client, message, "users")
 
+@Client.on_message(filters.command("broadcast_group", CMD) & filters.user(SUDO_USERS))
+async def broadcast_group_callback(client, message):
+    await start_broadcast(client, message, "chats")
 
 @Client.on_message(filters.command("stats", CMD) & filters.user(SUDO_USERS))
 async def stats(client, message):
@@ -128,34 +87,67 @@ async def stats(client, message):
     except ValueError:
         language = Language.EN
 
-    user_count = 0
-    chat_count = 0
-    game_count = 0
-    error_message = None  # Initialize error message
+    totals = await stats_service.get_totals()  # Estimated counts, fetched concurrently and cached
+    stats_message = get_message(language, "stats", **totals)
+    activity_message = get_message(language, "stats_activity", **stats_service.get_activity())
 
+    await message.reply_text(f"{stats_message}\n\n{activity_message}")
+
+@Client.on_message(filters.command("reloadwords", CMD) & filters.user(SUDO_USERS))
+async def reload_words(client, message):
+    """Reload the word lists from disk without restarting; active games keep their word."""
     try:
-        user_count = await db.get_user_count()
+        reloaded = await word_catalog.reload()
+        await message.reply_text(f"Reloaded {reloaded} word lists.")
     except Exception as e:
-        logging.error(f"Error getting user count: {e}")
-        error_message = await get_message(Language.EN, "error_getting_user_count")  # Store the error message
+        logger.exception("Error reloading word lists: %s", e)
+        await message.reply_text(f"Failed to reload word lists: {e}")
+
 
+async def send_profile_report(client, message, kind: str, seconds: float) -> None:
+    """Run a profile in the background and send its report to the log channel as a file."""
     try:
-        chat_count = await db.get_chat_count()
+        report = await (profiler.cpu(seconds) if kind == "cpu" else profiler.memory(seconds))
     except Exception as e:
-        logging.error(f"Error getting chat count: {e}")
-        if not error_message: # if there is no error message yet
-            error_message = await get_message(Language.EN, "error_getting_chat_count")
+        logger.exception("%s profile failed: %s", kind, e)
+        await message.reply_text(f"The {kind} profile failed: {e}")
+        return
 
+    document = BytesIO(report.encode("utf-8"))
+    document.name = f"{kind}-profile-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.txt"
     try:
-        game_count = await db.get_game_count()
+        await client.send_document(LOG_CHANNEL, document, caption=f"{kind} profile requested by {message.from_user.id}")
+        await message.reply_text(f"The {kind} profile was sent to the log channel.")
     except Exception as e:
-        logging.error(f"Error getting game count: {e}")
-        if not error_message: # if there is no error message yet
-            error_message = await get_message(Language.EN, "error_getting_game_count")
+        logger.warning("Failed to send the %s profile to the log channel: %s", kind, e)
+        document.seek(0)
+        await message.reply_document(document)
+
+async def start_profile(client, message, kind: str) -> None:
+    argument = message.command[1].lower() if len(message.command) > 1 else ""
+    if argument == "stop":
+        stopped = profiler.stop()
+        await message.reply_text("Stopping the profile; its report follows." if stopped else "No profile is running.")
+        return
+    try:
+        seconds = profiler.clamp(float(argument) if argument else 30)
+    except ValueError:
+        await message.reply_text(f"Usage: /{message.command[0]} [seconds|stop]")
+        return
+    if profiler.running is not None:
+        await message.reply_text(f"A {profiler.running} profile is already running.")
+        return
 
-    stats_message = await get_message(language, "stats", user_count=user_count, chat_count=chat_count, game_count=game_count)
+    # Profile in the background so this handler returns right away
+    asyncio.ensure_future(send_profile_report(client, message, kind, seconds))
+    await message.reply_text(f"Running a {kind} profile for {seconds:g}s. Send /{message.command[0]} stop to end it early.")
 
-    if error_message:  # Send the error message separately
-        await message.reply_text(error_message)
+@Client.on_message(filters.command("profile", CMD) & filters.user(SUDO_USERS))
+async def cpu_profile(client, message):
+    """Sample where the event loop spends its time: /profile [seconds|stop]."""
+    await start_profile(client, message, "cpu")
 
-    await message.reply_text(stats_message)  # Then send the stats message
+@Client.on_message(filters.command("memprofile", CMD) & filters.user(SUDO_USERS))
+async def memory_profile(client, message):
+    """Diff tracemalloc snapshots to find growing allocation sites: /memprofile [seconds|stop]."""
+    await start_profile(client, message, "memory")
@@ -1,63 +1,169 @@
 from time import time
+from datetime import datetime, timezone
 import logging
+import re
+import sys
+from types import FunctionType
+from typing import FrozenSet, Iterator, Optional
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from words import choice
+from words import (choice, normalize_answer, has_deck, deck_state, restore_deck, resolve_game_mode, to_language,
+                   word_catalog, configure_decks)
 from mongo.users_and_chats import db
+from mongo.stats import stats_service
 from utils import get_message, is_user_admin, update_user_score
 from script import Language
+from config import GAME_TIMEOUT, WORD_DECK_CACHE_SIZE, WORD_DECK_CACHE_TTL
+from timer_wheel import game_timers
 from buttons import get_game_keyboard, get_leader_keyboard
+from localization import catalog
 
-# Basic logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+logger = logging.getLogger(__name__)
 
 CMD = ["/", "."]
-GAME_TIMEOUT = 300
+# A command as Pyrogram's command filter reads one: a CMD prefix, the command name and maybe @botname
+COMMAND = re.compile(rf"(?:{'|'.join(map(re.escape, CMD))})(\w+)(?:@\w+)?(?:\s|$)")
+_commands: Optional[FrozenSet[str]] = None
+
+def _filter_commands(flt) -> Iterator[str]:
+    if getattr(flt, "commands", None) and getattr(flt, "prefixes", None):  # A filters.command(...)
+        yield from flt.commands
+    for part in ("base", "other"):  # And/Or/Invert filters
+        if hasattr(flt, part):
+            yield from _filter_commands(getattr(flt, part))
+
+def registered_commands() -> FrozenSet[str]:
+    """Names of the commands the loaded plugins register, read from their command filters once."""
+    global _commands
+    if _commands is None:
+        commands = set()
+        for name, module in list(sys.modules.items()):
+            if not name.startswith("plugins."):
+                continue
+            for value in list(vars(module).values()):
+                if isinstance(value, FunctionType):  # Smart-plugin handlers keep (handler, group) pairs
+                    for handler, _ in getattr(value, "handlers", []):
+                        commands.update(command.lower() for command in _filter_commands(handler.filters))
+        _commands = frozenset(commands)
+    return _commands
+
+catalog.require((
+    "game_started", "database_error", "dont_tell_answer", "correct_answer", "game_already_started",
+    "no_game_ongoing", "game_timed_out", "current_word", "new_word", "game_ended_confirmation", "choose_leader",
+))
+
+# Most MongoDB reads and writes one update may cost, per handler and case (checked by benchmarks/query_budget.py).
+# Chat settings come from the settings cache here; a cache miss adds one read.
+QUERY_BUDGETS = {
+    "game_command": {
+        "new game": {"reads": 1, "writes": 2},  # Settings; deck position + game
+        "game already running": {"reads": 0, "writes": 0},
+    },
+    "group_message_handler": {
+        "wrong guess": {"reads": 0, "writes": 0},  # Answered from the active-game registry
+        "correct guess": {"reads": 0, "writes": 2},  # Score is buffered; round claim (with the next game) + deck position
+        "round already won": {"reads": 0, "writes": 1},  # The failed round claim
+    },
+    "game_action_callback": {
+        "view": {"reads": 0, "writes": 0},
+        "next": {"reads": 0, "writes": 2},  # Deck position + game word
+        "end_game": {"reads": 0, "writes": 1},
+    },
+    "choose_leader_callback": {
+        "new leader": {"reads": 0, "writes": 2},
+    },
+    "end_game_command": {
+        "admin ends the game": {"reads": 0, "writes": 1},
+    },
+}
+
+async def answer_candidate_filter(_, __, message):
+    """Reject messages that cannot be a guess before anything touches MongoDB."""
+    text = message.text
+    if not text or message.from_user is None:  # Media, stickers, service messages, anonymous senders
+        return False
+    command = COMMAND.match(text)
+    if command and command.group(1).lower() in registered_commands():  # Other text is left to might_match
+        return False
+    return db.active_games.might_match(message.chat.id, text)
+
+answer_candidate = filters.create(answer_candidate_filter)
+
+configure_decks(WORD_DECK_CACHE_SIZE, WORD_DECK_CACHE_TTL)
+
+async def draw_word(chat_id, language, game_mode: str, save: bool = True) -> str:
+    """Draw the chat's next word from its no-repeat deck and (unless ``save`` is False) persist the deck position."""
+    await word_catalog.ensure_loaded(to_language(language), resolve_game_mode(game_mode))
+    if not has_deck(chat_id, game_mode, language):
+        restore_deck(chat_id, game_mode, await db.get_word_deck(chat_id, language.value, game_mode), language)
+
+    word = choice(game_mode, chat_id, language)
+    if save:
+        await save_deck(chat_id, language, game_mode)
+    return word
+
+async def save_deck(chat_id, language, game_mode: str) -> None:
+    state = deck_state(chat_id, game_mode, language)
+    if state is None:  # Evicted since the draw; the persisted position is the best one left
+        return
+    try:
+        await db.save_word_deck(chat_id, language.value, game_mode, state)
+    except Exception as e:
+        logger.warning("Failed to persist word deck for chat %s: %s", chat_id, e)
+
+def game_document(host, word: str, game_mode: str, language) -> dict:
+    """The fields of a game round hosted by the Pyrogram user ``host``."""
+    return {
+        'start': time(),
+        'started_at': datetime.now(timezone.utc),  # BSON date for the games TTL index
+        'host': {
+            'id': host.id,
+            'first_name': host.first_name,  # Use the host's first name
+            'username': host.username,
+        },
+        'word': word,
+        'game_mode': game_mode,
+        'language': language.value
+    }
+
+async def announce_game(client, message, language, game: dict) -> None:
+    """Start the new round's expiry timer and tell the group who hosts it."""
+    # Replaces the previous host's timer; armed for this round only
+    game_timers.schedule(message.chat.id, GAME_TIMEOUT, expire_game, client, message.chat.id, game.get('round'))
+    stats_service.games_started.record()
+
+    await message.reply_text(
+        get_message(language.value, "game_started", name=game['host']['first_name'], mode=game['game_mode'],
+                    lang=language.value),  # Use host's name
+        reply_markup=get_game_keyboard()
+    )
 
 async def new_game(client, message, language, game_mode: str, host_id: int) -> bool:
     try:
         if isinstance(game_mode, list):
             game_mode = game_mode[0]
 
-        word = choice(game_mode)  
-        logging.info(f"Selected word for game mode '{game_mode}': {word}")
-
-        bot_info = await client.get_me()
-        bot_id = bot_info.id
-
         # Check if the host is the bot itself
-        if host_id == bot_id:
-            logging.warning("The bot cannot be the host of the game.")
+        if host_id == client.me.id:  # Set by Client.start, so no API call is needed
+            logger.warning("The bot cannot be the host of the game.")
             return False
 
         # Retrieve the host's user information
         host_user = await client.get_users(host_id)
 
-        game_data = {
-            'start': time(),
-            'host': {
-                'id': host_id,
-                'first_name': host_user.first_name,  # Use the host's first name
-                'username': host_user.username,
-            },
-            'word': word,
-            'game_mode': game_mode,
-            'language': language.value
-        }
+        # Drawn only once the game will start, so a rejected one doesn't use up a word of the deck
+        word = await draw_word(message.chat.id, language, game_mode)
+        logger.debug("Selected a word for game mode '%s'.", game_mode)  # Never log the word itself: logs are not secret
 
-        await db.set_game(message.chat.id, game_data)
+        game_data = game_document(host_user, word, game_mode, language)
+        game_data['round'] = 1  # Each win moves the game to the next round (see check_answer)
 
-        await message.reply_text(
-            await get_message(language.value, "game_started", name=host_user.first_name, mode=game_mode, lang=language.value),  # Use host's name
-            reply_markup=get_game_keyboard()
-        )
+        await db.set_game(message.chat.id, game_data)
+        await announce_game(client, message, language, game_data)
         return True
     except Exception as e:
-        logging.error(f"Error in new_game: {e}")
-        await message.reply_text(await get_message(language.value, "database_error"))
+        logger.error("Error in new_game: %s", e)
+        await message.reply_text(get_message(language.value, "database_error"))
         return False
 
 async def check_answer(client, message, game, language):
@@ -67,23 +173,38 @@ async def check_answer(client, message, game, language):
     user_id = message.from_user.id
 
     if message.text:
-        if message.text.lower() == current_word.lower():
+        if normalize_answer(message.text) == normalize_answer(current_word):
             winner_id = message.from_user.id
             winner_name = message.from_user.first_name
 
             if winner_id == int(host_id):
                 await message.reply_sticker("CAACAgUAAyEFAASMPZdPAAEBWjVnnj1fEKVElmmYXzBc828kgDZTQQACNBQAAu9OkFSKgGFg2iVa2R4E")
-                await message.reply_text(await get_message(language, "dont_tell_answer"))
+                await message.reply_text(get_message(language, "dont_tell_answer"))
             else:
-                await update_user_score(chat_id, user_id, base_score=10, coins=5, xp=20)
+                # Claim the round and start the next one, with the winner as the host, in one conditional update:
+                # of several correct guesses only the first gets the new game back
+                game_mode = game.get("game_mode")
+                next_game = game_document(message.from_user, await draw_word(chat_id, language, game_mode, save=False),
+                                          game_mode, language)
+                try:
+                    claimed = await db.claim_round(chat_id, game.get("round"), current_word, next_game)
+                except Exception as e:
+                    logger.error("Error claiming the round in chat %s: %s", chat_id, e)
+                    await message.reply_text(get_message(language, "database_error"))
+                    return
+                if claimed is None:
+                    return  # Too late: another guess already won this round
+                await save_deck(chat_id, language, game_mode)
+
+                await update_user_score(chat_id, user_id, base_score=10, coins=5, xp=20,
+                                        defaults={"first_name": winner_name})
+                stats_service.games_answered.record()
 
                 await message.reply_sticker("CAACAgUAAx0CfU1WbQACBoBn36yAzLKr3Nxus9VV-4M6PDzR2gACBxQAAtRhGFVrCBGR0bqOOB4E")
                 await message.reply_text(
-                    await get_message(language, "correct_answer", winner=winner_name)
+                    get_message(language, "correct_answer", winner=winner_name)
                 )
-                
-                # Start a new game with the winner as the host
-                await new_game(client, message, language, game.get("game_mode"), winner_id)  # Pass winner_id
+                await announce_game(client, message, language, claimed)
 
 @Client.on_message(filters.group & filters.command("game", CMD))
 async def game_command(client, message):
@@ -98,38 +219,35 @@ async def game_command(client, message):
     try:
         ongoing_game = await db.get_game(chat_id)
     except Exception as e:
-        logging.error(f"Error getting game from database: {e}")
-        await message.reply_text(await get_message(language, "database_error"))
+        logger.error("Error getting game from database: %s", e)
+        await message.reply_text(get_message(language, "database_error"))
         return
 
     if ongoing_game:
-        await message.reply_text(await get_message(language, "game_already_started"))
+        await message.reply_text(get_message(language, "game_already_started"))
         return
 
     game_mode = await db.get_group_game_mode(chat_id)
     await new_game(client, message, language, game_mode, message.from_user.id)  # Pass host_id
 
-@Client.on_message(filters.group)
+@Client.on_message(filters.group & answer_candidate)
 async def group_message_handler(client, message):
     chat_id = message.chat.id
-    language_str = await db.get_chat_language(chat_id)
-    
-    try:
-        language = Language(language_str)
-    except ValueError:
-        language = Language.EN
-        logging.warning(f"Invalid language string '{language_str}' in database for chat {chat_id}. Defaulting to EN.")
-
-    game = await db.get_game(chat_id)
+    # User documents are keyed by the string ID /start registers them with
+    db.touch_activity(str(message.from_user.id), chat_id)  # Rate limited and written with the score flushes
+    game = await db.get_game(chat_id)  # Served from the in-memory registry
 
     if not game:
         return
 
-    time_elapsed = time() - game['start']
-    if time_elapsed >= GAME_TIMEOUT:
-        await handle_end_game(client, message, language)
-        return
+    language_str = game.get("language", "en")  # Stored with the game, so no settings lookup is needed
+    try:
+        language = Language(language_str)
+    except ValueError:
+        language = Language.EN
+        logger.warning("Invalid language string '%s' in game for chat %s. Defaulting to EN.", language_str, chat_id)
 
+    # Timeouts are handled proactively by game_timers, so no expiry check is needed here
     await check_answer(client, message, game, language)
 
 @Client.on_callback_query(filters.regex("view|next|end_game"))
@@ -146,18 +264,18 @@ async def game_action_callback(client, callback_query):
     try:
         game = await db.get_game(chat_id)
     except Exception as e:
-        logging.error(f"Error getting game from database: {e}")
-        await callback_query.answer(await get_message(language, "database_error"), show_alert=True)
+        logger.error("Error getting game from database: %s", e)
+        await callback_query.answer(get_message(language, "database_error"), show_alert=True)
         return
 
     if not game:
-        await callback_query.message.edit_text(await get_message(language, "no_game_ongoing"))
+        await callback_query.message.edit_text(get_message(language, "no_game_ongoing"))
         return
 
     time_elapsed = time() - game['start']
     if time_elapsed >= GAME_TIMEOUT:
         await handle_end_game(client, callback_query.message, language)
-        await callback_query.message.edit_text(await get_message(language, "game_timed_out"))
+        await callback_query.message.edit_text(get_message(language, "game_timed_out"))
         return
 
     host_id = game.get("host", {}).get("id")  # Get the host ID
@@ -169,7 +287,7 @@ async def game_action_callback(client, callback_query):
 
     if callback_query.data == "view":
         word = game['word']
-        await callback_query.answer(await get_message(language, "current_word", word=word), show_alert=True)
+        await callback_query.answer(get_message(language, "current_word", word=word), show_alert=True)
 
     elif callback_query.data == "next":
         try:
@@ -177,23 +295,23 @@ async def game_action_callback(client, callback_query):
             if isinstance(game_mode, list) and game_mode:
                 game_mode = game_mode[0]
             else:
-                logging.warning(f"No valid game mode found for chat_id: {chat_id}. Defaulting to 'easy'.")
+                logger.warning("No valid game mode found for chat_id: %s. Defaulting to 'easy'.", chat_id)
                 game_mode = "easy"
                 
-            new_word = choice(game_mode)
+            new_word = await draw_word(chat_id, language, game_mode)
             update_data = {"word": new_word}
             await db.update_game(chat_id, update_data)
 
-            await callback_query.answer(await get_message(language, "new_word", word=new_word), show_alert=True)
+            await callback_query.answer(get_message(language, "new_word", word=new_word), show_alert=True)
 
         except Exception as e:
-            logging.exception(f"Error updating word in database: {e}")
-            await callback_query.answer(await get_message(language, "database_error"), show_alert=True)
+            logger.exception("Error updating word in database: %s", e)
+            await callback_query.answer(get_message(language, "database_error"), show_alert=True)
 
     elif callback_query.data == "end_game":
         await handle_end_game(client, callback_query.message, language)
         await callback_query.message.delete()
-        await callback_query.answer(await get_message(language, "game_ended_confirmation"), show_alert=True)
+        await callback_query.answer(get_message(language, "game_ended_confirmation"), show_alert=True)
 
 @Client.on_callback_query(filters.regex("choose_leader"))
 async def choose_leader_callback(client, callback_query):
@@ -209,16 +327,16 @@ async def choose_leader_callback(client, callback_query):
     try:
         game = await db.get_game(chat_id)
         if game:
-            logging.warning(f"Game already ongoing for chat {chat_id}. Cannot choose a new leader.")
+            logger.warning("Game already ongoing for chat %s. Cannot choose a new leader.", chat_id)
             await callback_query.answer("A game is already ongoing. Please end the game first.", show_alert=True)
             return
 
         game_mode = await db.get_group_game_mode(chat_id)
         if not game_mode:
-            logging.warning(f"No game mode found for chat {chat_id}. Defaulting to 'easy'.")
+            logger.warning("No game mode found for chat %s. Defaulting to 'easy'.", chat_id)
             game_mode = "easy"
     except Exception as e:
-        logging.error(f"Error retrieving game mode for chat {chat_id}: {e}")
+        logger.error("Error retrieving game mode for chat %s: %s", chat_id, e)
         await callback_query.answer("Failed to retrieve game mode. Please try again.", show_alert=True)
         return
 
@@ -227,21 +345,60 @@ async def choose_leader_callback(client, callback_query):
         await new_game(client, callback_query.message, language, game_mode, user_id)  # Pass user_id
         await callback_query.answer(f"{callback_query.from_user.first_name} is now the leader! Starting the game...")
     except Exception as e:
-        logging.error(f"Error starting new game for chat {chat_id}: {e}")
+        logger.error("Error starting new game for chat %s: %s", chat_id, e)
         await callback_query.answer("Failed to start the game. Please try again.", show_alert=True)
 
 async def handle_end_game(client, message, language):
     try:
+        game_timers.cancel(message.chat.id)
         await db.remove_game(message.chat.id)
         
         await message.reply_text(
-            await get_message(language, "choose_leader"),
+            get_message(language, "choose_leader"),
             reply_markup=get_leader_keyboard()
         )
     except Exception as e:
-        logging.error(f"Error removing game from database: {e}")
-        await message.reply_text(await get_message(language, "database_error"))
+        logger.error("Error removing game from database: %s", e)
+        await message.reply_text(get_message(language, "database_error"))
         
+async def expire_game(client, chat_id, round_number):
+    """End a game round whose timer ran out and ask the group for a new leader.
+
+    The timer runs outside the chat's mailbox, so a winner may have started
+    the next round in the meantime; only the round the timer was set for is
+    removed.
+    """
+    game = await db.get_game(chat_id)
+    if not game or game.get("round") != round_number:
+        return
+
+    try:
+        language = Language(game.get("language", "en"))
+    except ValueError:
+        language = Language.EN
+
+    try:
+        if not await db.expire_round(chat_id, round_number):
+            return  # The round was won (or the game ended) while the timer fired
+        await client.send_message(
+            chat_id,
+            get_message(language, "choose_leader"),
+            reply_markup=get_leader_keyboard()
+        )
+        logger.info("Game in chat %s timed out.", chat_id)
+    except Exception as e:
+        logger.error("Error expiring game for chat %s: %s", chat_id, e)
+
+def schedule_active_games(client) -> int:
+    """Schedule expiry timers for the games warm loaded into the registry."""
+    now = time()
+    chat_ids = db.active_games.chat_ids()
+    for chat_id in chat_ids:
+        game = db.active_games.get(chat_id)
+        remaining = GAME_TIMEOUT - (now - game.get('start', now))
+        game_timers.schedule(chat_id, max(0, remaining), expire_game, client, chat_id, game.get('round'))
+    return len(chat_ids)
+
 @Client.on_message(filters.group & filters.command("end", CMD))
 async def end_game_command(client, message):
     chat_id = message.chat.id
@@ -2,14 +2,24 @@ from time import time
 import logging
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from mongo.users_and_chats import db
+from mongo.users_and_chats import db, UserNotFoundError
 from utils import get_message
+from localization import catalog
+from script import Language
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 CMD = ["/", "."]
 
+catalog.require(("insufficient_coins", "insufficient_xp", "payment_done"))
+
+# Most MongoDB reads and writes one update may cost, per handler and case (checked by benchmarks/query_budget.py)
+QUERY_BUDGETS = {
+    "score_command": {"score": {"reads": 1, "writes": 0}},
+    "top_command": {"top": {"reads": 2, "writes": 0}},  # Top entries + stored entries of buffered users outside them
+    "pay_command": {"pay": {"reads": 1, "writes": 0}},  # Transfers go through the score buffer
+}
+
 # Pay Command
 @Client.on_message(filters.command("pay", CMD) & filters.group)
 async def pay_command(client, message):
@@ -30,37 +40,29 @@ async def pay_command(client, message):
         sender_id = message.from_user.id
         chat_id = message.chat.id
 
-        # Fetch sender's current coins and XP
+        # Fetch sender's current coins and XP (including buffered awards)
         sender_data = await db.get_user_score(chat_id, sender_id)
         if sender_data['coins'] < amount:
-            await message.reply_text(get_message("insufficient_coins", language="en"))
+            await message.reply_text(get_message(Language.EN, "insufficient_coins"))
             return
 
         # Calculate XP to deduct (1 XP per coin)
         xp_to_deduct = amount
         if sender_data['xp'] < xp_to_deduct:
-            await message.reply_text(get_message("insufficient_xp", language="en"))
+            await message.reply_text(get_message(Language.EN, "insufficient_xp"))
             return
 
-        # Fetch recipient's current coins and XP
-        recipient_data = await db.get_user_score(chat_id, recipient_id)
-
-        # Update sender's and recipient's coins and XP
-        new_sender_coins = sender_data['coins'] - amount
-        new_sender_xp = sender_data['xp'] - xp_to_deduct
-        new_recipient_coins = recipient_data['coins'] + amount
-        new_recipient_xp = recipient_data['xp'] + xp_to_deduct
+        # Move coins and XP as buffered increments so pending awards are neither lost nor double counted
+        db.score_buffer.add(chat_id, sender_id, 0, -amount, -xp_to_deduct)
+        db.score_buffer.add(chat_id, recipient_id, 0, amount, xp_to_deduct)
 
-        await db.update_user_score(chat_id, sender_id, sender_data['score'], new_sender_coins, new_sender_xp)
-        await db.update_user_score(chat_id, recipient_id, recipient_data['score'], new_recipient_coins, new_recipient_xp)
-
-        await message.reply_text(get_message("payment_done", language="en").format(amount=amount, recipient_id=recipient_id, xp_to_deduct=xp_to_deduct))
+        await message.reply_text(get_message(Language.EN, "payment_done", amount=amount, recipient_id=recipient_id, xp_to_deduct=xp_to_deduct))
     except ValueError:
         await message.reply_text("Usage: .pay <amount>")
     except UserNotFoundError:
-        await message.reply_text("Recipient not found.")
+        await message.reply_text("You do not have any coins yet.")
     except Exception as e:
-        logging.error(f"Error in pay_command: {e}")
+        logger.error("Error in pay_command: %s", e)
         await message.reply_text("An error occurred while processing your payment.")
 
 # Score Command
@@ -71,7 +73,7 @@ async def score_command(client, message):
     chat_id = message.chat.id
 
     try:
-        # Fetch the user's score, coins, and XP from the database
+        # Fetch the user's score, coins, and XP, including points not yet flushed
         user_data = await db.get_user_score(chat_id, user_id)
 
         if user_data:
@@ -82,8 +84,10 @@ async def score_command(client, message):
             )
         else:
             await message.reply_text("You have not scored any points yet.")
+    except UserNotFoundError:
+        await message.reply_text("You have not scored any points yet.")
     except Exception as e:
-        logging.error(f"Error in score_command: {e}")
+        logger.error("Error in score_command: %s", e)
         await message.reply_text("An error occurred while retrieving your score.")
 
 # Top Command
@@ -102,5 +106,5 @@ async def top_command(client, message):
         else:
             await message.reply_text("No scores available yet.")
     except Exception as e:
-        logging.error(f"Error in top_command: {e}")
+        logger.error("Error in top_command: %s", e)
         await message.reply_text("An error occurred while retrieving the top users.")
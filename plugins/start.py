@@ -1,14 +1,26 @@
 import logging
-from pyrogram import Client, filters
+from pyrogram import Client, enums, filters
 from mongo.users_and_chats import db
 from utils import get_message, register_user, is_user_admin
 from script import Language
+from localization import catalog
 from buttons import get_settings_keyboard, get_language_keyboard, get_game_mode_keyboard, get_game_keyboard, get_inline_keyboard_pm
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
 
 CMD = ["/", "."]
 
+catalog.require(("error_registering_user", "welcome_new_group"))
+
+# Most MongoDB reads and writes one update may cost, per handler and case (checked by benchmarks/query_budget.py)
+QUERY_BUDGETS = {
+    "start_command": {"group": {"reads": 1, "writes": 1}},  # Registration upsert + group language
+    "settings_callback": {"settings": {"reads": 0, "writes": 0}},
+    "set_language_callback": {"set language": {"reads": 0, "writes": 1}},
+    "set_game_mode_callback": {"set game mode": {"reads": 0, "writes": 1}},
+    "back_to_game_callback": {"back to game": {"reads": 0, "writes": 0}},
+}
+
 @Client.on_message(filters.command("start"))
 async def start_command(client, message):
     user_id = str(message.from_user.id)
@@ -18,25 +30,26 @@ async def start_command(client, message):
     }
 
     try:
-        chat_id = str(message.chat.id) if message.chat.type in ["group", "supergroup"] else None
-        logging.info(f"/start command received from user {user_id} in {'group' if chat_id else 'private chat'}.")
+        # Chat settings are keyed by the numeric chat ID, as the settings callbacks store them
+        chat_id = message.chat.id if message.chat.type in (enums.ChatType.GROUP, enums.ChatType.SUPERGROUP) else None
+        logger.info("/start command received from user %s in %s.", user_id, "group" if chat_id else "private chat")
 
         # Register user
         if not await register_user(user_id, user_data):
-            await message.reply_text(await get_message(Language.EN, "error_registering_user"))
+            await message.reply_text(get_message(Language.EN, "error_registering_user"))
             return
 
         if chat_id:
             # Group context
             group_language = await db.get_chat_language(chat_id)
-            welcome_message = await get_message(group_language, "welcome_new_group")
+            welcome_message = get_message(group_language, "welcome_new_group")
             await message.reply_text(welcome_message, reply_markup=get_settings_keyboard())  # Use settings keyboard for groups
         else:  # Private chat
             # Send welcome message with inline keyboard for private messages
             await message.reply_text("Welcome! Use the buttons below:", reply_markup=get_inline_keyboard_pm())  # Use the same inline keyboard
 
     except Exception as e:
-        logging.exception(f"Error in start_command: {e}")
+        logger.exception("Error in start_command: %s", e)
         await message.reply_text("An error occurred. Please try again.")
 
 @Client.on_callback_query(filters.regex("settings"))
@@ -71,7 +84,7 @@ async def back_to_game_callback(client, callback_query):
         # If there is an ongoing game, show the current game state
         await callback_query.message.edit_text("You are back in the game!", reply_markup=get_game_keyboard())
     except Exception as e:
-        logging.error(f"Error retrieving game from database: {e}")
+        logger.error("Error retrieving game from database: %s", e)
         await callback_query.message.edit_text("An error occurred while trying to return to the game.")
 
 @Client.on_callback_query(filters.regex("change_language"))
@@ -110,7 +123,7 @@ async def set_language_callback(client, callback_query):
         await db.set_chat_language(chat_id, new_language_str)  # Store language as string in DB
         await callback_query.answer(f"Language changed to {new_language_str.upper()}!", show_alert=True)
     except Exception as e:
-        logging.exception(f"Error setting language: {e}")
+        logger.exception("Error setting language: %s", e)
         await callback_query.answer("An error occurred while setting the language. Please try again.", show_alert=True)
 
 @Client.on_callback_query(filters.regex("change_game_mode"))
@@ -149,7 +162,7 @@ async def set_game_mode_callback(client, callback_query):
         await db.set_group_game_mode(chat_id, [new_game_mode_str])  # Store as a list in DB
         await callback_query.answer(f"Game mode changed to {new_game_mode_str.capitalize()}!", show_alert=True)
     except Exception as e:
-        logging.exception(f"Error setting game mode: {e}")
+        logger.exception("Error setting game mode: %s", e)
         await callback_query.answer("An error occurred while setting the game mode. Please try again.", show_alert=True)
 
 @Client.on_callback_query(filters.regex("back_to_settings_language"))
@@ -2,7 +2,12 @@
 # Subscribe YouTube Channel For Amazing Bot @Tech_VJ
 # Ask Doubt on telegram @KingVJ01
 
+import hmac
 from aiohttp import web
+from metrics import registry
+from health import health_monitor
+from config import DEBUG_TOKEN
+from profiling import profiler, ProfilerBusyError
 
 routes = web.RouteTableDef()
 
@@ -10,6 +15,66 @@ routes = web.RouteTableDef()
 async def root_route_handler(request):
     return web.json_response("TamilBots")
 
+@routes.get("/metrics")
+async def metrics_route_handler(request):
+    """Expose the bot's metrics in the Prometheus text format."""
+    return web.Response(
+        body=registry.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+@routes.get("/healthz")
+async def liveness_route_handler(request):
+    """Liveness: 503 once the event loop stalls or the health probe stops reporting."""
+    status = health_monitor.liveness()
+    return web.json_response(status, status=200 if status["ok"] else 503)
+
+@routes.get("/readyz")
+async def readiness_route_handler(request):
+    """Readiness: 503 while MongoDB is slow or unreachable or Telegram is disconnected."""
+    status = health_monitor.readiness()
+    return web.json_response(status, status=200 if status["ok"] else 503)
+
+def debug_authorized(request) -> bool:
+    """The /debug routes need DEBUG_TOKEN as a bearer token or ?token=, and are off while it is unset."""
+    if not DEBUG_TOKEN:
+        return False
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ") or request.query.get("token", "")
+    return hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode())
+
+async def profile_response(request, kind: str):
+    if not debug_authorized(request):
+        raise web.HTTPNotFound()
+    try:
+        seconds = float(request.query.get("seconds", "30"))
+    except ValueError:
+        raise web.HTTPBadRequest(text="seconds must be a number")
+    try:
+        report = await (profiler.cpu(seconds) if kind == "cpu" else profiler.memory(seconds))
+    except ProfilerBusyError as e:
+        raise web.HTTPConflict(text=str(e))
+    return web.Response(
+        text=report,
+        headers={"Content-Disposition": f'attachment; filename="{kind}-profile.txt"'}
+    )
+
+@routes.get("/debug/profile")
+async def cpu_profile_route_handler(request):
+    """Sample the event loop for ?seconds= and return the report."""
+    return await profile_response(request, "cpu")
+
+@routes.get("/debug/memory")
+async def memory_profile_route_handler(request):
+    """Diff tracemalloc snapshots over ?seconds= and return the report."""
+    return await profile_response(request, "memory")
+
+@routes.post("/debug/profile/stop")
+async def stop_profile_route_handler(request):
+    """End the running profile early; the request that started it gets the report."""
+    if not debug_authorized(request):
+        raise web.HTTPNotFound()
+    return web.json_response({"stopped": profiler.stop()})
+
 
 async def web_server():
     web_app = web.Application(client_max_size=30000000)
@@ -0,0 +1,165 @@
+"""On-demand, time-bounded profiling of the running bot.
+
+Only one profile runs at a time. The CPU profiler samples the event-loop
+thread's stack from a separate thread, so the loop itself does no extra
+work; the memory profiler diffs two ``tracemalloc`` snapshots and only
+traces allocations while it runs.
+"""
+import asyncio
+import linecache
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+from config import PROFILE_INTERVAL, PROFILE_MAX_SECONDS
+
+TOP = 30  # Rows per report table
+
+FunctionKey = Tuple[str, int, str]  # filename, first line, function name
+
+class ProfilerBusyError(Exception):
+    """Custom exception for starting a profile while another one is running."""
+    pass
+
+def _is_idle(frame) -> bool:
+    # The loop waiting for I/O in the selector is idle time, not CPU time
+    return frame.f_code.co_name in ("select", "poll", "epoll") and frame.f_code.co_filename.endswith("selectors.py")
+
+def _describe(key: FunctionKey) -> str:
+    filename, lineno, name = key
+    return f"{name} ({filename}:{lineno})"
+
+class Profiler:
+    """Sampling CPU profiler and tracemalloc diff, both stopped after a bounded time."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.running: Optional[str] = None  # "cpu" or "memory" while a profile runs
+        self._stop_requested: Optional[asyncio.Event] = None
+
+    def clamp(self, seconds: float) -> float:
+        return min(max(seconds, 1.0), self.max_seconds)
+
+    def stop(self) -> bool:
+        """End the running profile early; its report is still produced. Returns whether one was running."""
+        if self._stop_requested is None:
+            return False
+        self._stop_requested.set()
+        return True
+
+    async def _run_for(self, seconds: float) -> float:
+        """Wait up to ``seconds`` (or until stopped) and return how long the profile ran."""
+        started = perf_counter()
+        try:
+            await asyncio.wait_for(self._stop_requested.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        return perf_counter() - started
+
+    def _claim(self, kind: str) -> None:
+        if self.running is not None:
+            raise ProfilerBusyError(f"A {self.running} profile is already running.")
+        self.running = kind
+        self._stop_requested = asyncio.Event()
+
+    def _release(self) -> None:
+        self.running = None
+        self._stop_requested = None
+
+    async def cpu(self, seconds: float) -> str:
+        """Sample the event-loop thread for ``seconds`` and return a report of the hottest functions."""
+        self._claim("cpu")
+        try:
+            seconds = self.clamp(seconds)
+            own: Counter = Counter()
+            cumulative: Counter = Counter()
+            totals = {"samples": 0, "idle": 0}
+            finished = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample, args=(threading.get_ident(), own, cumulative, totals, finished),
+                name="profiler", daemon=True,
+            )
+            sampler.start()
+            try:
+                elapsed = await self._run_for(seconds)
+            finally:
+                finished.set()
+                await asyncio.get_event_loop().run_in_executor(None, sampler.join)
+            return self._cpu_report(elapsed, own, cumulative, totals)
+        finally:
+            self._release()
+
+    def _sample(self, thread_id: int, own: Counter, cumulative: Counter, totals: Dict[str, int],
+                finished: threading.Event) -> None:
+        while not finished.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            totals["samples"] += 1
+            if _is_idle(frame):
+                totals["idle"] += 1
+                continue
+            code = frame.f_code
+            own[(code.co_filename, code.co_firstlineno, code.co_name)] += 1
+            seen = set()  # Count recursive functions once per sample
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if key not in seen:
+                    seen.add(key)
+                    cumulative[key] += 1
+                frame = frame.f_back
+
+    def _cpu_report(self, elapsed: float, own: Counter, cumulative: Counter, totals: Dict[str, int]) -> str:
+        samples = totals["samples"]
+        busy = samples - totals["idle"]
+        lines = [
+            f"CPU profile of the event loop, {datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S} UTC",
+            f"{elapsed:.1f}s, {samples} samples every {self.interval * 1000:.1f}ms, "
+            f"loop busy in {busy} ({busy / samples:.1%} of samples)" if samples else "No samples taken.",
+            "",
+            f"Top {TOP} functions by own samples:",
+        ]
+        lines += [f"{count:8d} {count / busy:7.1%}  {_describe(key)}" for key, count in own.most_common(TOP)]
+        lines += ["", f"Top {TOP} functions by cumulative samples:"]
+        lines += [f"{count:8d} {count / busy:7.1%}  {_describe(key)}" for key, count in cumulative.most_common(TOP)]
+        return "\n".join(lines) + "\n"
+
+    async def memory(self, seconds: float, frames: int = 10) -> str:
+        """Trace allocations for ``seconds`` and return the allocation sites that grew the most."""
+        self._claim("memory")
+        loop = asyncio.get_event_loop()
+        already_tracing = tracemalloc.is_tracing()
+        try:
+            seconds = self.clamp(seconds)
+            if not already_tracing:
+                tracemalloc.start(frames)
+            before = await loop.run_in_executor(None, tracemalloc.take_snapshot)
+            elapsed = await self._run_for(seconds)
+            after = await loop.run_in_executor(None, tracemalloc.take_snapshot)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not already_tracing:
+                tracemalloc.stop()  # Tracing slows every allocation, so never leave it on
+            self._release()
+
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+        differences = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+        lines = [
+            f"Memory profile, {datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S} UTC",
+            f"{elapsed:.1f}s, traced memory {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)",
+            "",
+            f"Top {TOP} allocation sites by growth:",
+        ]
+        for stat in differences[:TOP]:
+            frame = stat.traceback[0]
+            source = linecache.getline(frame.filename, frame.lineno).strip()
+            lines.append(f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  "
+                         f"{frame.filename}:{frame.lineno}  {source}")
+        return "\n".join(lines) + "\n"
+
+profiler = Profiler()
@@ -26,7 +26,9 @@ messages_en = {
     "provide_message": "Please provide a message to broadcast.",
     "broadcast_pm_success": "Broadcast completed! Total: {total}, Success: {success}, Failed: {failed}, Pending: {pending}.",
     "broadcast_group_success": "Group broadcast completed! Total: {total}, Success: {success}, Failed: {failed}, Pending: {pending}.",
+    "broadcast_progress": "Broadcast in progress… Total: {total}, Success: {success}, Failed: {failed}, Pending: {pending}.",
     "stats": "User  Count: {user_count}, Chat Count: {chat_count}, Game Count: {game_count}.",
+    "stats_activity": "Active games: {active_games}\nGames started: {started_hour} in the last hour, {started_day} in the last day\nWords guessed: {answered_hour} in the last hour, {answered_day} in the last day",
     "game_mode_set": "Game mode has been set to {mode}.",
     "invalid_mode": "Invalid game mode selected. Please choose from Easy, Hard, or Adult.",
     "language_set": "Group language has been set to {language}.",
@@ -43,6 +45,11 @@ messages_en = {
     "insufficient_coins": "You do not have enough coins to make this payment.",
     "insufficient_xp": "You do not have enough XP to make this payment.",
     "pay_usage": "Usage: .pay <amount>",
+    "game_timed_out": "The game has timed out. ⏰",
+    "error_registering_user": "An error occurred while registering you. Please try again.",
+    "error_getting_user_count": "An error occurred while getting the user count.",
+    "error_getting_chat_count": "An error occurred while getting the chat count.",
+    "error_getting_game_count": "An error occurred while getting the game count.",
 }
 
 # Tamil Messages
@@ -65,6 +72,7 @@ messages_ta = {
     "provide_message": "பிரசுரிக்க ஒரு செய்தியை வழங்கவும்.",
     "broadcast_pm_success": "பிரசுரிப்பு முடிந்தது! மொத்தம்: {total}, வெற்றி: {success}, தோல்வி : {failed}, நிலுவையில்: {pending}.",
     "broadcast_group_success": "குழு பிரசுரிப்பு முடிந்தது! மொத்தம்: {total}, வெற்றி: {success}, தோல்வி: {failed}, நிலுவையில்: {pending}.",
+    "broadcast_progress": "பிரசுரிப்பு நடைபெறுகிறது… மொத்தம்: {total}, வெற்றி: {success}, தோல்வி: {failed}, நிலுவையில்: {pending}.",
     "game_mode_set": "விளையாட்டு முறை {mode} ஆக அமைக்கப்பட்டுள்ளது.",
     "invalid_mode": "தவறான விளையாட்டு முறை தேர்ந்தெடுக்கப்பட்டுள்ளது. தயவுசெய்து எளிதான, கடினமான அல்லது பெரியவனாக தேர்ந்தெடுக்கவும்.",
     "language_set": "குழு மொழி {language} ஆக அமைக்கப்பட்டுள்ளது.",
@@ -103,6 +111,7 @@ messages_hi = {
     "provide_message": "कृपया प्रसारण के लिए एक संदेश प्रदान करें।",
     "broadcast_pm_success": "प्रसारण पूरा हुआ! कुल: {total}, सफल: {success}, विफल: {failed}, लंबित: {pending}.",
     "broadcast_group_success": "समूह प्रसारण पूरा हुआ! कुल: {total}, सफल: {success}, विफल: {failed}, लंबित: {pending}.",
+    "broadcast_progress": "प्रसारण जारी है… कुल: {total}, सफल: {success}, विफल: {failed}, लंबित: {pending}.",
     "stats": "उपयोगकर्ता संख्या: {user_count}, चैट संख्या: {chat_count}, खेल संख्या: {game_count}.",
     "game_mode_set": "खेल मोड {mode} पर सेट किया गया है।",
     "invalid_mode": "अमान्य खेल मोड चुना गया है। कृपया आसान, कठिन, या वयस्क में से चुनें।",
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import math
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class TimerWheel:
+    """Hashed timer wheel running on the asyncio event loop.
+
+    Timers are keyed (one per key; scheduling a key again replaces its timer)
+    and stored in ``slots`` buckets of ``tick`` seconds, so schedule and
+    cancel are O(1) and each tick only visits the timers of one bucket.
+    Delays longer than one revolution wait out the extra ``rounds``.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512):
+        if tick <= 0 or slots <= 0:
+            raise ValueError("tick and slots must be positive")
+        self.tick = tick
+        self.slots = slots
+        self._wheel = [dict() for _ in range(slots)]  # slot -> {key: [rounds, callback, args]}
+        self._slot_of: Dict[Hashable, int] = {}
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable[..., Any], *args) -> None:
+        """Run ``callback(*args)`` after ``delay`` seconds, replacing any timer already set for ``key``."""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        rounds, offset = divmod(ticks, self.slots)
+        if offset == 0:  # A whole number of revolutions lands on the current slot, one round early
+            rounds -= 1
+        slot = (self._cursor + offset) % self.slots
+        self._wheel[slot][key] = [rounds, callback, args]
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel the timer for ``key``. Returns whether one was pending."""
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return False
+        self._wheel[slot].pop(key, None)
+        return True
+
+    def _advance(self) -> None:
+        self._cursor = (self._cursor + 1) % self.slots
+        bucket = self._wheel[self._cursor]
+        due = []
+        for key, timer in bucket.items():
+            if timer[0] > 0:
+                timer[0] -= 1
+            else:
+                due.append((key, timer))
+        for key, (_, callback, args) in due:
+            del bucket[key]
+            del self._slot_of[key]
+            self._fire(key, callback, args)
+
+    def _fire(self, key: Hashable, callback: Callable[..., Any], args: Tuple) -> None:
+        try:
+            result = callback(*args)
+            if asyncio.iscoroutine(result):
+                task = asyncio.ensure_future(result)
+                task.add_done_callback(lambda t, key=key: self._log_failure(key, t))
+        except Exception as e:
+            logger.exception("Timer callback for %s failed: %s", key, e)
+
+    @staticmethod
+    def _log_failure(key: Hashable, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Timer callback for %s failed: %s", key, task.exception())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        next_tick = loop.time() + self.tick
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            # Catch up on ticks missed while the loop was busy instead of drifting
+            while loop.time() >= next_tick:
+                self._advance()
+                next_tick += self.tick
+
+    def start(self) -> None:
+        """Start ticking on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop ticking; pending timers are kept but no longer fire."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Expiry timers for active games, keyed by chat ID
+game_timers = TimerWheel()
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import sys
+import threading
+import traceback
+from time import monotonic, perf_counter
+from typing import Optional
+from config import WATCHDOG_INTERVAL, WATCHDOG_LAG_THRESHOLD
+from metrics import active_handlers
+
+logger = logging.getLogger(__name__)
+
+class LoopWatchdog:
+    """Detects event-loop stalls and reports what was blocking the loop.
+
+    A task on the loop refreshes a heartbeat every ``interval`` seconds and a
+    daemon thread checks it. When the heartbeat is older than ``threshold``,
+    the loop is blocked right now, so the thread captures the loop thread's
+    current stack and logs it with the handler (and its update) that the
+    running task was serving. Each stall is reported once, and its total
+    duration is logged when the loop recovers.
+    """
+
+    def __init__(self, threshold: float = WATCHDOG_LAG_THRESHOLD, interval: float = WATCHDOG_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+        self._heartbeat = monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def _beat(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            before = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - before - self.interval
+            if lag > self.threshold:
+                logger.warning("Event loop was blocked for %.3fs.", lag)
+            self._heartbeat = monotonic()
+
+    def _watch(self) -> None:
+        reported = None  # Heartbeat of the stall already reported
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            if heartbeat == reported or monotonic() - heartbeat <= self.threshold:
+                continue
+            reported = heartbeat
+            self.stalls += 1
+            self._report(monotonic() - heartbeat)
+
+    def _report(self, blocked_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        call_site = stack[-1] if stack else None
+
+        # The task the loop is running while blocked, and the handler it was serving
+        task = asyncio.current_task(self._loop)
+        call = active_handlers.get(task) if task is not None else None
+        if call is not None:
+            culprit = (f"handler {call.handler} ({call.update_type} in chat {call.chat_id}, "
+                       f"running for {perf_counter() - call.started:.3f}s)")
+        else:
+            culprit = f"task {task.get_name()}" if task is not None else "a callback outside any task"
+
+        where = f"{call_site.filename}:{call_site.lineno} in {call_site.name}" if call_site else "unknown"
+        logger.warning("Event loop blocked for over %.3fs by %s at %s. Loop thread stack:\n%s",
+                       blocked_for, culprit, where, "".join(traceback.format_list(stack)))
+
+    def start(self) -> None:
+        """Start watching the running event loop."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_event_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = monotonic()
+        self._task = asyncio.ensure_future(self._beat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,157 @@
+"""Compiled word packs: deduplicated, pre-normalized word lists served from mmap.
+
+A pack is laid out as::
+
+    header   magic "CWPK", version, count, CRC32 of everything after the header, blob size
+    offsets  (count + 1) little-endian uint32 offsets into the blob
+    blob     the UTF-8 encoded words, back to back
+
+Build the packs next to the text lists with ``python wordpack.py build``.
+"""
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CWPK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQ")  # magic, version, reserved, count, crc32, blob size
+OFFSET = struct.Struct("<I")
+PACK_SUFFIX = ".pack"
+
+class WordPackError(Exception):
+    """Custom exception for malformed or corrupt word packs."""
+    pass
+
+class WordPack:
+    """Read-only, memory-mapped word pack with O(1) random access by index.
+
+    Words are decoded on access, so neither opening a pack nor holding it
+    costs memory proportional to the number of words.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with self.path.open("rb") as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # Empty file
+                raise WordPackError(f"{self.path.name} is empty") from e
+
+        if len(self._map) < HEADER.size:
+            raise WordPackError(f"{self.path.name} is too short to be a word pack")
+        magic, version, _, self._count, self._checksum, blob_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise WordPackError(f"{self.path.name} is not a version {VERSION} word pack")
+
+        self._offsets_at = HEADER.size
+        self._blob_at = self._offsets_at + (self._count + 1) * OFFSET.size
+        if self._blob_at + blob_size != len(self._map):
+            raise WordPackError(f"{self.path.name} is truncated or has trailing data")
+        # Cheap layout check of the offset table's ends; verify() reads everything to check the CRC
+        first, = OFFSET.unpack_from(self._map, self._offsets_at)
+        last, = OFFSET.unpack_from(self._map, self._blob_at - OFFSET.size)
+        if first != 0 or last != blob_size:
+            raise WordPackError(f"{self.path.name} has a corrupt offset table")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("word pack index out of range")
+        start, end = struct.unpack_from("<II", self._map, self._offsets_at + index * OFFSET.size)
+        return self._map[self._blob_at + start:self._blob_at + end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._count):
+            yield self[index]
+
+    def verify(self) -> bool:
+        """Check the CRC32 of the offset table and blob (reads the whole pack)."""
+        checksum = 0
+        for start in range(HEADER.size, len(self._map), 1 << 20):
+            checksum = zlib.crc32(self._map[start:start + (1 << 20)], checksum)
+        return checksum == self._checksum
+
+    def close(self) -> None:
+        self._map.close()
+
+def pack_path(text_path: Path) -> Path:
+    """Return where the compiled pack of a text word list lives."""
+    return text_path.with_suffix(PACK_SUFFIX)
+
+def unique_words(words: Iterable[str]) -> List[str]:
+    """Drop blank and repeated words, keeping the first occurrence of each."""
+    return list(dict.fromkeys(word for word in words if word))
+
+def build_pack(words: List[str], destination: Path) -> int:
+    """Write a pack holding ``words`` (deduplicated, order kept). Returns the word count."""
+    unique = unique_words(words)
+    offsets = bytearray()
+    blob = bytearray()
+    offsets += OFFSET.pack(0)
+    for word in unique:
+        blob += word.encode("utf-8")
+        offsets += OFFSET.pack(len(blob))
+    if len(blob) > 0xFFFFFFFF:
+        raise WordPackError("word pack blob exceeds 4 GiB")
+
+    body = bytes(offsets) + bytes(blob)
+    header = HEADER.pack(MAGIC, VERSION, 0, len(unique), zlib.crc32(body), len(blob))
+
+    # Write to a temporary file and rename so readers never map a half-written pack
+    temporary = destination.with_name(destination.name + ".tmp")
+    with temporary.open("wb") as file:
+        file.write(header)
+        file.write(body)
+    os.replace(temporary, destination)
+    return len(unique)
+
+def build_all(root: Path) -> int:
+    """Compile every ``*.txt`` word list under ``root``. Returns the number of packs built."""
+    from words import load_words  # Late import: words itself loads packs from this module
+
+    built = 0
+    for text_path in sorted(root.rglob("*.txt")):
+        count = build_pack(load_words(text_path), pack_path(text_path))
+        logger.info("Built %s with %s words.", pack_path(text_path).relative_to(root), count)
+        built += 1
+    return built
+
+def verify_all(root: Path) -> bool:
+    """Verify the checksum of every pack under ``root``."""
+    ok = True
+    for path in sorted(root.rglob(f"*{PACK_SUFFIX}")):
+        try:
+            pack = WordPack(path)
+            valid = pack.verify()
+            pack.close()
+        except WordPackError as e:
+            logger.error("%s: %s", path.relative_to(root), e)
+            ok = False
+            continue
+        logger.log(logging.INFO if valid else logging.ERROR,
+                   "%s: %s", path.relative_to(root), "ok" if valid else "checksum mismatch")
+        ok = ok and valid
+    return ok
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    wordlists = Path(sys.argv[2]) if len(sys.argv) > 2 else Path(__file__).resolve().parent / "wordlists"
+    if command == "build":
+        build_all(wordlists)
+    elif command == "verify":
+        sys.exit(0 if verify_all(wordlists) else 1)
+    else:
+        print("Usage: python wordpack.py [build|verify] [wordlists directory]")
+        sys.exit(2)
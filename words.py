@@ -1,27 +1,30 @@
+import asyncio
 import logging
-from random import choice as choice_
+import threading
+from random import choice as choice_, getrandbits
 from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
 import os
+from script import Language
+from mongo.cache import TTLCache
+from wordpack import WordPack, WordPackError, pack_path, unique_words, PACK_SUFFIX
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 def process_word(word: str) -> str:
     """Process the word by replacing underscores with spaces and converting to lowercase."""
     return word.replace('_', ' ').lower()
 
+def normalize_answer(text: str) -> str:
+    """Normalize a guess or answer for comparison: collapse whitespace and lowercase."""
+    return " ".join(text.split()).lower()
+
 # Define the script directory
 script_dir = Path(os.path.dirname(os.path.abspath(__file__)))
 
-# Define paths to word lists
-easy_wordlist_path = script_dir / 'wordlists' / 'easy.txt'
-hard_wordlist_path = script_dir / 'wordlists' / 'hard.txt'
-adult_wordlist_path = script_dir / 'wordlists' / 'adult.txt'
-
-# Initialize word lists
-easy_words = []
-hard_words = []
-adult_words = []
+# Game modes with a word list, and the one used when a mode is unknown
+GAME_MODES = ("easy", "hard", "adult")
+DEFAULT_GAME_MODE = "easy"
 
 def load_words(file_path):
     """Load words from a given file path."""
@@ -29,49 +32,276 @@ def load_words(file_path):
     try:
         with file_path.open(encoding='UTF-8') as file:
             words = [process_word(line.strip()) for line in file]
-        logging.info(f"Loaded {len(words)} words from {file_path.name}.")
+        logger.info("Loaded %s words from %s.", len(words), file_path.name)
     except FileNotFoundError:
-        logging.error(f"Word list file {file_path.name} not found.")
+        logger.error("Word list file %s not found.", file_path.name)
         raise  # Re-raise the FileNotFoundError to be handled elsewhere
 
     return words
 
-# Load words from files
-try:
-    easy_words = load_words(easy_wordlist_path)
-    hard_words = load_words(hard_wordlist_path)
-    adult_words = load_words(adult_wordlist_path)
-except FileNotFoundError as e:
-    logging.error(f"Failed to load word lists: {e}")
-    # Consider a more graceful exit here if word lists are critical. For example:
-    # exit(1)  # Or provide default words if possible.
-
-# Dictionary to hold word lists
-word_lists = {
-    "easy": easy_words,
-    "hard": hard_words,
-    "adult": adult_words,
-    # "normal": easy_words + hard_words,  # Example combined mode (optional)
-}
-
-def choice(game_mode: str) -> str:
-    """Select a random word from the specified game mode."""
+def to_language(language: Union[Language, str, None]) -> Language:
+    """Coerce a Language or language code to a Language, defaulting to EN."""
+    if isinstance(language, Language):
+        return language
+    try:
+        return Language(language)
+    except ValueError:
+        return Language.EN
+
+WordList = Union[Tuple[str, ...], WordPack]
+
+def open_word_list(file_path: Path) -> WordList:
+    """Open a word list, preferring its compiled pack when it is at least as new as the text file.
+
+    Opening only checks the pack's header and layout, so it doesn't read the
+    whole file; checksums are verified when the packs are built (see the
+    Dockerfile). Either way the words are the same: normalized, without
+    blanks or duplicates, in file order.
+    """
+    pack = pack_path(file_path)
+    try:
+        if pack.exists() and (not file_path.exists() or pack.stat().st_mtime >= file_path.stat().st_mtime):
+            word_pack = WordPack(pack)
+            logger.info("Mapped %s words from %s.", len(word_pack), pack.name)
+            return word_pack
+    except WordPackError as e:
+        logger.error("Ignoring unusable word pack %s: %s", pack.name, e)
+    return tuple(unique_words(load_words(file_path)))
+
+class WordCatalog:
+    """Word lists keyed by (Language, game mode), loaded lazily on first use.
+
+    English lists live at ``wordlists/<mode>.txt`` and other languages at
+    ``wordlists/<lang>/<mode>.txt``; a language without its own list for a
+    mode shares the English one. Each list is loaded once, from its
+    memory-mapped pack when one was built (see ``wordpack.py``) or else into
+    an immutable tuple, and shared by every chat.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._lists: Dict[Tuple[Language, str], WordList] = {}
+        self._lock = threading.Lock()  # Lists may be loaded from the preload thread
+
+    def path_for(self, language: Language, game_mode: str) -> Path:
+        """Return the text file holding a (language, mode) word list."""
+        if language is Language.EN:
+            return self.root / f"{game_mode}.txt"
+        return self.root / language.value / f"{game_mode}.txt"
+
+    def is_loaded(self, language: Language, game_mode: str) -> bool:
+        return (language, game_mode) in self._lists
+
+    def get(self, language: Language, game_mode: str) -> WordList:
+        """Return the word list for a language and (already resolved) game mode, loading it if needed."""
+        key = (language, game_mode)
+        word_list = self._lists.get(key)
+        if word_list is not None:
+            return word_list
+
+        with self._lock:
+            lists = self._lists
+            word_list = lists.get(key)
+            if word_list is None:
+                word_list = self._load(language, game_mode, lists)
+        return word_list
+
+    async def ensure_loaded(self, language: Language, game_mode: str) -> None:
+        """Load a word list in the executor so a first use never reads files on the event loop."""
+        if not self.is_loaded(language, game_mode):
+            await asyncio.get_event_loop().run_in_executor(None, self.get, language, game_mode)
+
+    def _load(self, language: Language, game_mode: str, lists: Dict[Tuple[Language, str], WordList]) -> WordList:
+        """Load a word list into ``lists``, resolving the English fallback through the same dict."""
+        path = self.path_for(language, game_mode)
+        if language is not Language.EN and not path.exists() and not pack_path(path).exists():
+            logger.info("No %s word list for %s. Using the English one.", game_mode, language.name)
+            word_list = lists.get((Language.EN, game_mode))
+            if word_list is None:
+                word_list = self._load(Language.EN, game_mode, lists)
+        else:
+            try:
+                word_list = open_word_list(path)
+            except FileNotFoundError as e:
+                logger.error("Failed to load word list: %s", e)
+                word_list = ()
+        lists[(language, game_mode)] = word_list
+        return word_list
+
+    def reload_sync(self) -> int:
+        """Rebuild every loaded word list from disk and swap them all in at once.
+
+        The new lists are built aside and published with a single reference
+        assignment, so concurrent readers see either the old or the new set,
+        never a partial one. Lists nobody used stay unloaded.
+        """
+        fresh: Dict[Tuple[Language, str], WordList] = {}
+        for language, game_mode in list(self._lists):
+            if (language, game_mode) not in fresh:
+                self._load(language, game_mode, fresh)
+        with self._lock:
+            self._lists = fresh
+        logger.info("Reloaded %s word lists.", len(fresh))
+        return len(fresh)
+
+    async def reload(self) -> int:
+        """Reload the word lists in a worker thread. Returns the number of lists reloaded."""
+        return await asyncio.get_event_loop().run_in_executor(None, self.reload_sync)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Return the modification times of every word list file, for change detection."""
+        snapshot = {}
+        for path in self.root.rglob("*"):
+            if path.suffix in (".txt", PACK_SUFFIX):
+                try:
+                    snapshot[str(path)] = path.stat().st_mtime
+                except FileNotFoundError:  # Removed while scanning (e.g. a pack being replaced)
+                    pass
+        return snapshot
+
+    async def watch(self, interval: float) -> None:
+        """Poll the word list files every ``interval`` seconds and reload when they change."""
+        loop = asyncio.get_event_loop()
+        previous = await loop.run_in_executor(None, self.snapshot)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                current = await loop.run_in_executor(None, self.snapshot)
+                if current != previous:
+                    logger.info("Word list files changed on disk. Reloading.")
+                    await self.reload()
+                    previous = current
+            except Exception as e:
+                logger.error("Error watching word lists: %s", e)
+
+    def preload_sync(self, languages: Iterable[Language]) -> None:
+        """Load every game mode for the given languages."""
+        for language in languages:
+            for game_mode in GAME_MODES:
+                self.get(language, game_mode)
+
+    async def preload(self, languages: Iterable[Language] = (Language.EN,)) -> None:
+        """Load word lists in a worker thread so startup and the event loop are not held up."""
+        languages = [to_language(language) for language in languages]
+        await asyncio.get_event_loop().run_in_executor(None, self.preload_sync, languages)
+        logger.info("Preloaded word lists for %s.", ", ".join(language.name for language in languages))
+
+word_catalog = WordCatalog(script_dir / 'wordlists')
+
+def _permute(index: int, size: int, seed: int) -> int:
+    """Map ``index`` to its position in the seeded permutation of ``range(size)``.
+
+    A four-round Feistel network is a bijection on the smallest even power of
+    two covering ``size``; cycle walking folds it back into ``range(size)``.
+    The domain is at most 4x ``size``, so a lookup takes O(1) expected steps
+    and a permutation needs no storage beyond its seed.
+    """
+    bits = max(2, (size - 1).bit_length())
+    bits += bits % 2
+    half = bits // 2
+    mask = (1 << half) - 1
+    keys = [(seed * (0x9E3779B1 + 2 * i) + i) & 0xFFFFFFFF for i in range(4)]
+    value = index
+    while True:
+        left, right = value >> half, value & mask
+        for key in keys:
+            mixed = ((right ^ key) * 0x85EBCA6B) & 0xFFFFFFFF
+            left, right = right, left ^ ((mixed ^ (mixed >> 13)) & mask)
+        value = (left << half) | right
+        if value < size:
+            return value
+
+class WordDeck:
+    """A shuffled deck over a word list: every word is drawn once before reshuffling.
+
+    Only the permutation seed and a cursor are stored, so a deck costs the same
+    for any list size and draws are O(1).
+    """
+    __slots__ = ("seed", "cursor", "size")
+
+    def __init__(self, size: int, seed: Optional[int] = None, cursor: int = 0):
+        self.size = size
+        self.seed = getrandbits(32) if seed is None else seed
+        self.cursor = cursor
+
+    def draw(self, size: int) -> int:
+        """Return the next index, reshuffling when the deck is exhausted or the list changed size."""
+        if size != self.size or self.cursor >= size:
+            self.size, self.seed, self.cursor = size, getrandbits(32), 0
+        index = _permute(self.cursor, size, self.seed)
+        self.cursor += 1
+        return index
+
+    def state(self) -> dict:
+        """Return the deck as a small document suitable for persisting."""
+        return {"seed": self.seed, "cursor": self.cursor, "size": self.size}
+
+# Per-chat decks, keyed by (chat_id, language, game mode). Every draw is persisted (see plugins/game.py),
+# so a deck evicted from here is restored the next time its chat plays. The game plugin sizes the cache
+# from config.py with configure_decks; this module doesn't import config so wordpack.py can run without it.
+_decks = TTLCache(10000, 3600)
+
+def configure_decks(maxsize: int, ttl: float) -> None:
+    """Replace the per-chat deck cache with one holding ``maxsize`` decks for ``ttl`` idle seconds."""
+    global _decks
+    _decks = TTLCache(maxsize, ttl)
+
+def resolve_game_mode(game_mode: str) -> str:
+    """Return the canonical game mode, falling back to easy."""
     if not isinstance(game_mode, str):
-        logging.error(f"Expected game_mode to be a string, got {type(game_mode).__name__}.")
-        game_mode = "easy"  # Default to easy if not a string
+        logger.error("Expected game_mode to be a string, got %s.", type(game_mode).__name__)
+        return DEFAULT_GAME_MODE  # Default to easy if not a string
+
+    mode = game_mode.lower()  # Case-insensitive lookup
+    if mode not in GAME_MODES:
+        logger.warning("Invalid game mode: %s. Defaulting to easy.", game_mode)
+        return DEFAULT_GAME_MODE
+    return mode
+
+def _deck_key(chat_id, game_mode: str, language) -> Tuple[object, Language, str]:
+    return chat_id, to_language(language), resolve_game_mode(game_mode)
 
-    word_list = word_lists.get(game_mode.lower())  # Case-insensitive lookup
+def choice(game_mode: str, chat_id=None, language: Union[Language, str] = Language.EN) -> str:
+    """Select a word from the specified game mode in the given language.
 
-    if word_list is None:
-        logging.warning(f"Invalid game mode: {game_mode}. Defaulting to easy.")
-        word_list = word_lists["easy"]
+    With a ``chat_id`` the word is drawn from that chat's deck, so the chat
+    sees every word once before any repeats.
+    """
+    key = _deck_key(chat_id, game_mode, language)
+    word_list = word_catalog.get(key[1], key[2])
 
     if not word_list:
-        logging.error(f"No words available for game mode: {game_mode}!")
+        logger.error("No words available for game mode: %s!", game_mode)
         return "No words available"  # Or another default message
 
-    return choice_(word_list)
+    if chat_id is None:
+        return choice_(word_list)
+
+    found, deck = _decks.get(key)
+    if not found:
+        deck = WordDeck(len(word_list))
+        _decks.set(key, deck)
+    return word_list[deck.draw(len(word_list))]
+
+def has_deck(chat_id, game_mode: str, language: Union[Language, str] = Language.EN) -> bool:
+    """Tell whether the chat already has an in-memory deck for the game mode."""
+    found, _ = _decks.get(_deck_key(chat_id, game_mode, language))
+    return found
+
+def deck_state(chat_id, game_mode: str, language: Union[Language, str] = Language.EN) -> Optional[dict]:
+    """Return the persistable state of the chat's deck, if it has one."""
+    found, deck = _decks.get(_deck_key(chat_id, game_mode, language))
+    return deck.state() if found else None
+
+def restore_deck(chat_id, game_mode: str, state: Optional[dict], language: Union[Language, str] = Language.EN) -> None:
+    """Install a deck from persisted state; a missing or invalid state starts a fresh deck."""
+    key = _deck_key(chat_id, game_mode, language)
+    try:
+        deck = WordDeck(int(state["size"]), seed=int(state["seed"]), cursor=int(state["cursor"]))
+    except (TypeError, KeyError, ValueError):
+        deck = WordDeck(len(word_catalog.get(key[1], key[2])))
+    _decks.set(key, deck)
 
-def get_word_list(game_mode: str):
-    """Return a list of words based on the specified game mode."""
-    return word_lists.get(game_mode.lower(), word_lists["easy"])  # Default to easy if mode is invalid
+def get_word_list(game_mode: str, language: Union[Language, str] = Language.EN) -> WordList:
+    """Return the words of the specified game mode and language."""
+    return word_catalog.get(to_language(language), resolve_game_mode(game_mode))  # Default to easy if mode is invalid